@@ -0,0 +1,142 @@
+"""
+Admission Control
+Caps how many engine-bound requests run at once, so a burst of players queues
+briefly or is turned away with a retry hint instead of every request slowing
+down together.
+
+Notes:
+- At most `max_active` requests run at a time; up to `max_queued` more wait
+  in arrival order. A request is rejected at once (Overloaded) if the queue
+  is full or its estimated wait already exceeds `max_wait`, and also if it
+  has waited `max_wait` without being admitted.
+- The wait estimate comes from a moving average of how long admitted
+  requests take, so it follows the real engine speed.
+- Fairness: one session (browser) may have at most `per_session` requests
+  running or queued, so a single client cannot fill the queue.
+- `Overloaded.retry_after` is a whole number of seconds, for a Retry-After header.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict
+
+# Weight of the newest request in the moving average of service time
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted in time; carries a retry hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Thread-safe concurrency limit with a bounded, deadline-aware wait queue.
+    """
+
+    def __init__(self, max_active: int, max_queued: int = 32, max_wait: float = 5.0,
+                 per_session: int = 2, initial_service_time: float = 0.5):
+        if max_active < 1:
+            raise ValueError("max_active must be at least 1")
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.per_session = per_session
+        self.service_time = initial_service_time
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queue: Deque[object] = deque()
+        self._per_session: Dict[str, int] = {}
+
+        # Counters for stats()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0, "session": 0, "timed_out": 0}
+        self.total_wait = 0.0
+        self.max_seen_wait = 0.0
+
+    def _estimated_wait(self, position: int) -> float:
+        """
+        Expected wait for a request with `position` requests ahead of it in the queue.
+        """
+        return (position // self.max_active + 1) * self.service_time
+
+    def _reject(self, reason: str, position: int) -> Overloaded:
+        self.rejected[reason] += 1
+        return Overloaded(reason, max(1, math.ceil(self._estimated_wait(position))))
+
+    @contextmanager
+    def admit(self, session_key: str):
+        """
+        Hold one of the `max_active` slots for the duration of the `with` block.
+        Raises Overloaded instead of queueing past `max_wait`.
+        """
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            if self._per_session.get(session_key, 0) >= self.per_session:
+                raise self._reject("session", len(self._queue))
+            if self._active >= self.max_active or self._queue:
+                if len(self._queue) >= self.max_queued:
+                    raise self._reject("queue_full", len(self._queue))
+                if self._estimated_wait(len(self._queue)) > self.max_wait:
+                    raise self._reject("deadline", len(self._queue))
+            self._per_session[session_key] = self._per_session.get(session_key, 0) + 1
+            self._queue.append(ticket)
+            try:
+                deadline = start + self.max_wait
+                while not (self._queue[0] is ticket and self._active < self.max_active):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("timed_out", len(self._queue))
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._leave_session(session_key)
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            self._active += 1
+            waited = time.monotonic() - start
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_seen_wait = max(self.max_seen_wait, waited)
+            self._cond.notify_all()
+
+        began = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - began
+            with self._cond:
+                self._active -= 1
+                self._leave_session(session_key)
+                self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+                self._cond.notify_all()
+
+    def _leave_session(self, session_key: str) -> None:
+        count = self._per_session.get(session_key, 0) - 1
+        if count > 0:
+            self._per_session[session_key] = count
+        else:
+            self._per_session.pop(session_key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_active": self.max_active,
+                "active": self._active,
+                "queued": len(self._queue),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "mean_wait_ms": round(self.total_wait * 1000 / self.admitted, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_seen_wait * 1000, 1),
+                "service_time_ms": round(self.service_time * 1000, 1),
+            }
@@ -0,0 +1,182 @@
+"""
+Analysis Jobs
+A bounded background queue for PGN analysis, so a long game does not hold a
+request thread (and trip proxy timeouts) while it is being analyzed.
+
+Notes:
+- Jobs are deduplicated by a content key: submitting the same PGN again while
+  the first job is queued, running or finished returns the existing job.
+- A fixed number of worker threads run jobs; submissions beyond `max_queued`
+  waiting jobs are rejected with QueueFull.
+- Finished jobs are kept for `keep_finished` seconds so the result can be fetched.
+- Jobs can publish partial results while they run; `wait_partial()` lets a
+  streaming endpoint follow them as they arrive.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job."""
+
+
+class AnalysisJob:
+    """
+    One queued or running analysis and its progress.
+    """
+
+    def __init__(self, key: str, payload: Any):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.payload = payload
+        self.status = "queued"  # queued -> running -> done | failed
+        self.done = 0
+        self.total = 0
+        self.partial: List[Any] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs `run(payload, progress, publish)` for each submitted job on background workers.
+    `progress(count, total)` adds `count` finished units out of `total`;
+    `publish(item)` appends a partial result.
+    """
+
+    def __init__(self, run: Callable[..., Dict[str, Any]],
+                 workers: int = 1, max_queued: int = 16, keep_finished: float = 3600.0):
+        self.run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+
+        self._cond = threading.Condition()
+        self._queue: "deque[AnalysisJob]" = deque()
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._by_key: Dict[str, AnalysisJob] = {}
+        self._threads = []
+
+    # -------------------------
+    # Public API
+    # -------------------------
+
+    def submit(self, key: str, payload: Any) -> AnalysisJob:
+        """
+        Queue a job, or return the existing job with the same key.
+        """
+        with self._cond:
+            self._expire_locked()
+            existing = self._by_key.get(key)
+            if existing is not None and existing.status != "failed":
+                return existing
+            if len(self._queue) >= self.max_queued:
+                raise QueueFull(f"{len(self._queue)} analyses already waiting")
+
+            job = AnalysisJob(key, payload)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._queue.append(job)
+            self._start_workers_locked()
+            # Stream readers wait on the same condition, so wake everyone
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_partial(self, job: AnalysisJob, start: int, timeout: float) -> Tuple[List[Any], bool]:
+        """
+        Wait up to `timeout` seconds for partial results past index `start`.
+        Returns the new items and whether the job has finished.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(job.partial) <= start and not job.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job.partial[start:], job.finished
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            running = sum(1 for j in self._jobs.values() if j.status == "running")
+            return {
+                "workers": self.workers,
+                "queued": len(self._queue),
+                "running": running,
+                "jobs": len(self._jobs),
+            }
+
+    # -------------------------
+    # Workers
+    # -------------------------
+
+    def _start_workers_locked(self) -> None:
+        # Started lazily so forked server workers each get their own threads
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"analysis-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.status = "running"
+
+            def progress(count: int, total: int, job=job) -> None:
+                with self._cond:
+                    job.total = total
+                    job.done += count
+
+            def publish(item: Any, job=job) -> None:
+                with self._cond:
+                    job.partial.append(item)
+                    self._cond.notify_all()
+
+            try:
+                result = self.run(job.payload, progress, publish)
+            except Exception as e:
+                with self._cond:
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.finished_at = time.time()
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                job.result = result
+                job.status = "done"
+                job.finished_at = time.time()
+                self._cond.notify_all()
+
+    def _expire_locked(self) -> None:
+        cutoff = time.time() - self.keep_finished
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
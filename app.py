@@ -1,10 +1,34 @@
+import atexit
+import functools
+import hashlib
 import io
-from typing import List, Dict, Any
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterator, Optional
 import chess
 import chess.pgn
 import chess.engine
-from flask import Flask, render_template, request, session, jsonify, redirect, url_for
-from openings_data import OPENINGS_DATABASE
+from flask import (Flask, Response, g, has_app_context, render_template, request, session, jsonify,
+                   redirect, stream_with_context, url_for)
+from admission import AdmissionController, Overloaded
+from analysis_jobs import JobQueue, QueueFull
+from board_cache import BoardCache
+from engine_loop import EngineLoop
+from engine_pool import EnginePool, EnginePoolTimeout
+from engine_search import SearchStats, TrivialStats, analyse_until_stable, forced_move, settle_trivial
+from eval_cache import CachedEval, EvalCache
+from eval_store import EvalStore
+from game_store import GameStore, MemoryGameBackend, SqliteGameBackend, StoredGame
+from opening_book import open_book
+from opening_index import load_index
+from ply_trie import PlyTrie
+from ponder import Ponderer
+from result_cache import ResultCache
+from tablebase import TABLEBASE_DEPTH, TABLEBASE_WIN_CP, TablebaseProber
 
 # -------------------------
 # Hardcoded configuration
@@ -20,6 +44,134 @@ ENGINE_TIME_PER_MOVE = 0.1
 # Time for deep analysis of PGNs (higher is better but slower)
 ENGINE_TIME_PER_ANALYSIS = 0.5
 MATE_SCORE = 100000
+START_FEN = chess.STARTING_FEN
+
+# Engine pool: number of long-lived Stockfish processes shared by all requests
+ENGINE_POOL_SIZE = 2
+# Restart an engine after this many searches (keeps memory/hash growth in check)
+ENGINE_POOL_MAX_SEARCHES = 500
+# Seconds a request waits for a free engine before giving up
+ENGINE_POOL_TIMEOUT = 30.0
+# Free engines go to live moves first, then hints, then analysis; while analysis
+# is waiting it still gets at least this share of checkouts
+ENGINE_BATCH_MIN_SHARE = 0.2
+# Admission control for live-play requests (moves, hints, new games, review):
+# at most ADMISSION_MAX_ACTIVE run at once and ADMISSION_MAX_QUEUED wait; a
+# request that would wait longer than ADMISSION_MAX_WAIT seconds gets an
+# immediate 503 with Retry-After. Each session may hold ADMISSION_PER_SESSION slots.
+# An admitted request also waits at most ADMISSION_MAX_WAIT for each engine checkout.
+ADMISSION_MAX_ACTIVE = ENGINE_POOL_SIZE
+ADMISSION_MAX_QUEUED = 32
+ADMISSION_MAX_WAIT = 5.0
+ADMISSION_PER_SESSION = 2
+# UCI options applied to every pooled engine
+ENGINE_OPTIONS = {"Hash": 64}
+# Drive all engine processes from one shared asyncio loop instead of a
+# background thread per engine (compare: python engine_loop.py bench <path>)
+ENGINE_SHARED_LOOP = True
+
+# Local Syzygy tablebase directories (separated by os.pathsep; None disables).
+# Positions with at most SYZYGY_MAX_PIECES pieces are settled by probing in
+# Python, and the same path is passed to every pooled engine as SyzygyPath.
+SYZYGY_PATH = None
+SYZYGY_MAX_PIECES = 7
+
+# Stop a search before its time limit once the best move has been stable for
+# EARLY_STOP_ITERATIONS depths (from EARLY_STOP_MIN_DEPTH on) and the score
+# has moved by less than EARLY_STOP_SCORE_MARGIN centipawns
+ENGINE_EARLY_STOP = True
+EARLY_STOP_ITERATIONS = 4
+EARLY_STOP_SCORE_MARGIN = 15
+EARLY_STOP_MIN_DEPTH = 12
+
+# Live move grading scores this many candidate moves in one MultiPV search
+MOVE_GRADING_MULTIPV = 4
+
+# Keep analysing the player-to-move position in the background while the player
+# thinks, for at most PONDER_MAX_TIME seconds, and give up on idle games after
+# PONDER_IDLE_TIMEOUT. Pondering never takes the last PONDER_RESERVE_ENGINES
+# free engines, and a ponder result is used only if it reached PONDER_MIN_DEPTH.
+PONDER_ENABLED = True
+PONDER_MAX_TIME = 30.0
+PONDER_IDLE_TIMEOUT = 60.0
+PONDER_RESERVE_ENGINES = 1
+PONDER_MIN_DEPTH = 10
+# Before pondering, pre-evaluate the positions after the player's
+# SPECULATE_MOVES most likely moves, spending at most SPECULATE_BUDGET seconds
+SPECULATE_MOVES = 3
+SPECULATE_BUDGET = 0.5
+
+# Where live games are kept between requests: "memory" (this process only) or
+# "sqlite" (GAME_STORE_PATH, shared by all workers). Games idle for
+# GAME_STORE_TTL_HOURS expire; the session cookie only carries the game id.
+GAME_STORE_BACKEND = "memory"
+GAME_STORE_PATH = "games.sqlite3"
+GAME_STORE_TTL_HOURS = 7 * 24
+# Reviewing a live game reuses the evaluations made while grading its moves;
+# positions without one (e.g. the final position) are searched for this long
+REVIEW_BACKFILL_TIME = 0.05
+
+# Prebuilt opening index (`python opening_index.py build`), memory-mapped on first
+# use of the opening trainer; rebuilt automatically when openings_data.py is newer
+OPENINGS_INDEX_PATH = "openings.idx"
+
+# Polyglot opening book for the engine's live-play moves (None disables it).
+# Built from openings_data.py on first use, or with `python opening_book.py build`.
+# The book is consulted for the first BOOK_MAX_PLY plies of a game.
+BOOK_PATH = "book.bin"
+BOOK_MAX_PLY = 30
+
+# Memory budget of the per-session live game boards kept between requests (bytes)
+BOARD_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# Memory budget of the in-process evaluation cache (bytes)
+EVAL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# On-disk evaluation store shared by all workers and restarts (None disables it)
+EVAL_STORE_PATH = "eval_store.sqlite3"
+# Drop stored evaluations older than this many days, and keep at most this many rows
+EVAL_STORE_MAX_AGE_DAYS = 30
+EVAL_STORE_MAX_ROWS = 1_000_000
+
+# PGN analysis splits a game into this many contiguous segments, each searched
+# on its own pooled engine at the same time (1 = sequential)
+ANALYSIS_SEGMENTS = ENGINE_POOL_SIZE
+# Don't bother splitting off segments shorter than this many positions
+ANALYSIS_MIN_SEGMENT_LENGTH = 8
+
+# Analysis mode: "uniform" searches every position for ENGINE_TIME_PER_ANALYSIS;
+# "adaptive" does a cheap pass over the whole game, then spends the rest of a
+# fixed per-game budget re-searching only the critical plies at full depth
+ANALYSIS_MODE = "uniform"
+# Adaptive mode: total engine time per game (seconds) and shallow-pass time per position
+ANALYSIS_BUDGET_SECONDS = 15.0
+ANALYSIS_SHALLOW_TIME = 0.05
+# Adaptive mode: a ply is critical if the shallow pass sees at least this much
+# centipawn loss, or an eval swing at least this large between positions
+ANALYSIS_CRITICAL_CP_LOSS = 50
+ANALYSIS_CRITICAL_SWING = 150
+
+# Background analysis: number of games analyzed at once. Each uses up to
+# ANALYSIS_SEGMENTS engines, so at most ANALYSIS_WORKERS * ANALYSIS_SEGMENTS
+# analysis searches run at the same time.
+ANALYSIS_WORKERS = 1
+# Analyses allowed to wait in the queue before /analyze answers 503
+ANALYSIS_MAX_QUEUED = 16
+# Seconds a finished analysis stays available for its review page
+ANALYSIS_KEEP_SECONDS = 3600
+# Seconds between keep-alive comments on an idle analysis event stream
+ANALYSIS_STREAM_KEEPALIVE = 15
+
+# Finished analyses are kept compressed in this directory, keyed by the game's
+# moves and the analysis settings, and served again without the engine (None disables)
+ANALYSIS_CACHE_DIR = "analysis_cache"
+ANALYSIS_CACHE_MAX_FILES = 1000
+# Bump to invalidate cached analyses after changing how plies are graded
+ANALYSIS_CACHE_VERSION = 3
+# Graded plies kept in a move-prefix trie, so a game sharing its first moves
+# with an earlier one ("uniform" mode) only has its new tail searched
+ANALYSIS_PREFIX_MAX_PLIES = 20000
+# Analyze the sample game in the background on the first request, so /review-sample is instant
+ANALYSIS_WARMUP = True
 
 SECRET_KEY = "chesskit_python_clone_demo_secret_key_123"
 
@@ -74,15 +226,65 @@ def _session_get(key: str, default):
     return session.get(key, default)
 
 
-def _save_session_game(moves_uci: List[str], player_color: str):
-    session["moves_uci"] = moves_uci
-    session["player_color"] = player_color
+_game_store = None
+_game_store_lock = threading.Lock()
+
+
+def _get_game_store() -> GameStore:
+    global _game_store
+    if _game_store is None:
+        with _game_store_lock:
+            if _game_store is None:
+                if GAME_STORE_BACKEND == "sqlite":
+                    backend = SqliteGameBackend(GAME_STORE_PATH)
+                else:
+                    backend = MemoryGameBackend()
+                _game_store = GameStore(backend, ttl=GAME_STORE_TTL_HOURS * 3600)
+    return _game_store
+
+
+def _save_session_game(moves_uci: List[str], player_color: str, board: chess.Board = None,
+                       new_game: bool = False):
+    """
+    Persist the game server-side under the session's game id (a fresh one if `new_game`).
+    `board` (the position after `moves_uci`) is kept for the next request.
+    """
+    store = _get_game_store()
+    game_id = None if new_game else _session_get("game_id", None)
+    loaded = g.get("stored_game")
+    if game_id and loaded is not None and loaded.game_id == game_id:
+        # Keep the evaluations recorded with the game (set_position drops undone ones)
+        game = loaded
+        game.player_color = player_color
+    else:
+        game = StoredGame(game_id, player_color) if game_id else store.create(player_color)
+    position = board if board is not None else _board_from_moves(moves_uci)
+    game.set_position(moves_uci, position)
+    store.save(game)
+
+    session["game_id"] = game.game_id
+    # Sessions from before the game store carried the whole move list
+    session.pop("moves_uci", None)
+    session.pop("player_color", None)
+    if board is not None:
+        _board_cache.put(_session_id(), moves_uci, board)
 
 
 def _load_session_game():
-    moves_uci = _session_get("moves_uci", [])
-    player_color = _session_get("player_color", "white")
-    return moves_uci, player_color
+    game = _get_game_store().get(_session_get("game_id", None))
+    g.stored_game = game
+    if game is None:
+        return list(_session_get("moves_uci", [])), _session_get("player_color", "white")
+    return game.moves_uci(), game.player_color
+
+
+def _session_id() -> str:
+    """
+    A stable id for this browser session, used to key server-side per-game state.
+    """
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    return session["sid"]
 
 
 def _board_from_moves(moves_uci: List[str]) -> chess.Board:
@@ -92,107 +294,567 @@ def _board_from_moves(moves_uci: List[str]) -> chess.Board:
     return board
 
 
-def _engine():
-    # Note: For production, you'd initialize this once
-    return chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
+_board_cache = BoardCache(BOARD_CACHE_MAX_BYTES)
 
 
-def _maybe_engine_start(moves_uci: List[str], player_color: str) -> List[str]:
+def _session_board(moves_uci: List[str]) -> chess.Board:
+    """
+    This session's board after `moves_uci`, advanced or rewound from the cached one when possible.
+    Hand it back with `_save_session_game(..., board)` once the request is done with it.
+    """
+    return _board_cache.checkout(_session_id(), moves_uci)
+
+
+_engine_pool = None
+_engine_loop = None
+_engine_pool_lock = threading.Lock()
+
+
+def _get_engine_pool() -> EnginePool:
+    """
+    Create the engine pool on first use (after any gunicorn fork) and reuse it.
+    """
+    global _engine_pool, _engine_loop
+    if _engine_pool is None:
+        with _engine_pool_lock:
+            if _engine_pool is None:
+                if ENGINE_SHARED_LOOP:
+                    _engine_loop = EngineLoop()
+                    # Threading exit hooks run last-registered first: the pool quits its engines, then the loop stops
+                    getattr(threading, "_register_atexit", atexit.register)(_engine_loop.close)
+                options = dict(ENGINE_OPTIONS)
+                if SYZYGY_PATH:
+                    options.setdefault("SyzygyPath", SYZYGY_PATH)
+                _engine_pool = EnginePool(
+                    STOCKFISH_PATH,
+                    size=ENGINE_POOL_SIZE,
+                    max_searches=ENGINE_POOL_MAX_SEARCHES,
+                    options=options,
+                    timeout=ENGINE_POOL_TIMEOUT,
+                    loop=_engine_loop,
+                    batch_min_share=ENGINE_BATCH_MIN_SHARE,
+                )
+                # Engine I/O threads are non-daemon and are joined *before* atexit
+                # handlers run, so the pool must be closed from the threading hook.
+                getattr(threading, "_register_atexit", atexit.register)(_engine_pool.close)
+    return _engine_pool
+
+
+def _engine(priority: str = "interactive"):
+    """
+    Check out a warmed-up engine from the pool; it is returned on leaving the `with` block.
+    `priority` is the scheduling class: "interactive" (live play), "hint" or "batch" (analysis).
+    """
+    return _get_engine_pool().engine(timeout=_engine_timeout(), priority=priority)
+
+
+def _engine_timeout() -> float:
+    """
+    How long a checkout may wait: ENGINE_POOL_TIMEOUT, or less within an
+    admitted request, so a slow checkout fails fast instead of holding its slot.
+    """
+    deadline = g.get("engine_deadline") if has_app_context() else None
+    if deadline is None:
+        return ENGINE_POOL_TIMEOUT
+    return max(0.0, min(ENGINE_POOL_TIMEOUT, deadline - time.monotonic()))
+
+
+_search_stats = SearchStats()
+
+
+def _engine_search(engine, board: chess.Board, limit: chess.engine.Limit) -> Dict[str, Any]:
+    """
+    Run one search on a checked-out engine, stopping early once the result is stable.
+    """
+    if not ENGINE_EARLY_STOP:
+        return engine.analyse(board, limit)
+    return analyse_until_stable(
+        engine, board, limit,
+        stable_iterations=EARLY_STOP_ITERATIONS,
+        score_margin=EARLY_STOP_SCORE_MARGIN,
+        min_depth=EARLY_STOP_MIN_DEPTH,
+        stats=_search_stats,
+    )
+
+
+# -------------------------
+# Cached engine searches
+# -------------------------
+
+_eval_cache = EvalCache(max_bytes=EVAL_CACHE_MAX_BYTES)
+_eval_store = None
+_eval_store_lock = threading.Lock()
+
+
+def _get_eval_store():
+    """
+    Open the shared on-disk evaluation store on first use, or None if disabled.
+    """
+    global _eval_store
+    if _eval_store is None and EVAL_STORE_PATH:
+        with _eval_store_lock:
+            if _eval_store is None:
+                _eval_store = EvalStore(
+                    EVAL_STORE_PATH,
+                    max_age=EVAL_STORE_MAX_AGE_DAYS * 24 * 3600,
+                    max_rows=EVAL_STORE_MAX_ROWS,
+                )
+                getattr(threading, "_register_atexit", atexit.register)(_eval_store.close)
+    return _eval_store
+
+
+def _lookup_eval(board: chess.Board, limit: chess.engine.Limit):
+    """
+    Find a search result covering `limit`: memory first, then the shared store.
+    """
+    info = _eval_cache.get(board, limit)
+    if info is None:
+        store = _get_eval_store()
+        entry = store.get(board, limit) if store is not None else None
+        if entry is not None:
+            _eval_cache.put_entry(board, entry)
+            info = entry.to_info()
+    return info
+
+
+def _remember_eval(board: chess.Board, limit: chess.engine.Limit, info: Dict[str, Any]) -> None:
+    """
+    Record a fresh search result in both cache tiers.
+    """
+    if "score" not in info:
+        return
+    entry = CachedEval.from_info(info, limit)
+    _eval_cache.put_entry(board, entry)
+    store = _get_eval_store()
+    if store is not None:
+        store.put(board, entry)
+
+
+_trivial_stats = TrivialStats()
+_tablebase = None
+_tablebase_loaded = False
+_tablebase_lock = threading.Lock()
+
+
+def _get_tablebase() -> Optional[TablebaseProber]:
+    """
+    Open the Syzygy tables on first use; None if not configured or none were found.
+    """
+    global _tablebase, _tablebase_loaded
+    if not _tablebase_loaded:
+        with _tablebase_lock:
+            if not _tablebase_loaded:
+                if SYZYGY_PATH:
+                    try:
+                        _tablebase = TablebaseProber(SYZYGY_PATH, SYZYGY_MAX_PIECES)
+                    except OSError:
+                        _tablebase = None
+                    if _tablebase is not None and not _tablebase.max_pieces:
+                        _tablebase = None
+                _tablebase_loaded = True
+    return _tablebase
+
+
+def _evaluate(board: chess.Board, limit: chess.engine.Limit,
+              search: Callable[[chess.Board], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Evaluate `board` without the engine where possible: game-over positions are
+    scored exactly, a forced move takes the evaluation of the position it leads
+    to (which is cached, so the next ply gets it for free), and anything else
+    comes from the evaluation caches, the endgame tablebase or, failing those,
+    `search(board)`.
+    """
+    info = settle_trivial(board)
+    if info is not None:
+        _trivial_stats.record(terminal=1)
+        return info
+
+    move = forced_move(board)
+    if move is not None:
+        child = board.copy()
+        child.push(move)
+        child_info = _evaluate(child, limit, search)
+        _trivial_stats.record(forced=1)
+        return dict(child_info, pv=[move] + list(child_info.get("pv", [])))
+
+    info = _lookup_eval(board, limit)
+    if info is None:
+        tablebase = _get_tablebase()
+        info = tablebase.probe(board) if tablebase is not None else None
+        if info is None:
+            info = search(board)
+        _remember_eval(board, limit, info)
+    return info
+
+
+def _analyse(board: chess.Board, limit: chess.engine.Limit, priority: str = "interactive") -> Dict[str, Any]:
+    """
+    `engine.analyse` behind the trivial-position fast path and the evaluation
+    caches; an engine is only checked out (at `priority`) on a miss.
+    """
+    def search(b: chess.Board) -> Dict[str, Any]:
+        with _engine(priority) as engine:
+            return _engine_search(engine, b, limit)
+
+    return _evaluate(board, limit, search)
+
+
+def _best_move(board: chess.Board, limit: chess.engine.Limit) -> chess.Move:
+    """
+    The engine's move in `board`, taken from the (possibly cached) principal variation.
+    """
+    move = forced_move(board)
+    if move is not None:
+        _trivial_stats.record(forced=1)
+        return move
+    info = _analyse(board, limit)
+    if info.get("pv"):
+        return info["pv"][0]
+    with _engine() as engine:
+        return engine.play(board, limit).move
+
+
+_ponderer = None
+_ponderer_lock = threading.Lock()
+
+
+def _get_ponderer() -> Ponderer:
+    global _ponderer
+    if _ponderer is None:
+        with _ponderer_lock:
+            if _ponderer is None:
+                _ponderer = Ponderer(
+                    _get_engine_pool(),
+                    multipv=MOVE_GRADING_MULTIPV,
+                    max_time=PONDER_MAX_TIME,
+                    reserve=PONDER_RESERVE_ENGINES,
+                    idle_timeout=PONDER_IDLE_TIMEOUT,
+                    speculate_moves=SPECULATE_MOVES,
+                    speculate_limit=chess.engine.Limit(time=ENGINE_TIME_PER_MOVE),
+                    speculate_budget=SPECULATE_BUDGET,
+                    on_result=_remember_eval,
+                )
+    return _ponderer
+
+
+def _start_ponder(board: chess.Board, player_color: str) -> None:
+    """
+    Ponder the current position if it is the player's turn; otherwise stop this game's ponder.
+    """
+    if not PONDER_ENABLED:
+        return
+    player_turn = chess.WHITE if player_color == "white" else chess.BLACK
+    if board.turn == player_turn and not board.is_game_over():
+        _get_ponderer().start(_session_id(), board)
+    else:
+        _get_ponderer().cancel(_session_id())
+
+
+def _take_ponder(board: chess.Board, move: chess.Move = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    The MultiPV lines this game's ponder found for `board`, if any, stopping the ponder.
+    Its best line also goes into the evaluation caches. Passing the player's
+    `move` scores the speculative pre-analysis.
+    """
+    if not PONDER_ENABLED:
+        return None
+    lines = _get_ponderer().take(_session_id(), board, PONDER_MIN_DEPTH, move)
+    if lines:
+        # No fixed limit: the entry covers requests up to the time actually pondered
+        _remember_eval(board, chess.engine.Limit(), lines[0])
+    return lines
+
+
+_book = None
+_book_loaded = False
+_book_lock = threading.Lock()
+_book_stats = {"hits": 0, "misses": 0}
+
+
+def _get_book():
+    """
+    The memory-mapped Polyglot book, opened on first use; None if there is none.
+    """
+    global _book, _book_loaded
+    if not _book_loaded:
+        with _book_lock:
+            if not _book_loaded:
+                source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openings_data.py")
+                _book = open_book(BOOK_PATH, source)
+                if _book is not None:
+                    getattr(threading, "_register_atexit", atexit.register)(_book.close)
+                _book_loaded = True
+    return _book
+
+
+def _book_move(board: chess.Board) -> Optional[chess.Move]:
+    """
+    A weighted-random book move for `board`, or None once out of book.
+    """
+    if board.ply() >= BOOK_MAX_PLY:
+        return None
+    book = _get_book()
+    if book is None:
+        return None
+    try:
+        move = book.weighted_choice(board).move
+    except IndexError:
+        move = None
+    with _book_lock:
+        _book_stats["hits" if move is not None else "misses"] += 1
+    return move
+
+
+def _engine_reply(board: chess.Board, limit: chess.engine.Limit,
+                  suggested: Optional[chess.Move] = None) -> chess.Move:
+    """
+    The engine's move in live play: a book move while in book, else `suggested`
+    (e.g. from a PV already searched) if legal, else a fresh search.
+    """
+    move = _book_move(board)
+    if move is not None:
+        return move
+    if suggested is not None and suggested in board.legal_moves:
+        return suggested
+    return _best_move(board, limit)
+
+
+def _maybe_engine_start(moves_uci: List[str], player_color: str, board: chess.Board = None) -> List[str]:
     """
     If the engine should move first (player picked black), make its opening move.
+    `board`, if given, is the position after `moves_uci` and is updated in place.
     """
-    board = _board_from_moves(moves_uci)
+    if board is None:
+        board = _board_from_moves(moves_uci)
     player_is_white = (player_color == "white")
     side_to_move_is_player = (board.turn == chess.WHITE and player_is_white) or (
             board.turn == chess.BLACK and not player_is_white)
 
     if not side_to_move_is_player and not board.is_game_over():
-        with _engine() as engine:
-            mv = engine.play(board, chess.engine.Limit(time=ENGINE_TIME_PER_MOVE)).move
+        mv = _engine_reply(board, chess.engine.Limit(time=ENGINE_TIME_PER_MOVE))
         board.push(mv)
         moves_uci.append(mv.uci())
 
     return moves_uci
 
 
+def _grade_live_move(board: chess.Board, move: chess.Move, limit: chess.engine.Limit,
+                     lines: Optional[List[Dict[str, Any]]] = None):
+    """
+    Grade `move` in `board` from one MultiPV search of the position before it.
+    Returns (best_line, played_line): the engine's top line, and the line that
+    starts with `move`. Only if `move` is not among the top MOVE_GRADING_MULTIPV
+    candidates is a second, searchmoves-restricted search run for it.
+    The second move of `played_line` is the engine's reply.
+    `lines` are MultiPV lines already searched for `board` (e.g. by pondering);
+    a move among them is graded from that one search.
+    Otherwise, if the position after `move` was pre-evaluated at `limit`
+    (speculation) and the best line is cached at `limit` too, no search runs.
+    """
+    if forced_move(board) is not None:
+        info = _analyse(board, limit)
+        return info, info
+
+    if lines is None:
+        cached = _lookup_eval(board, limit)
+        if cached is not None and cached.get("pv") and cached["pv"][0] == move:
+            return cached, cached
+
+    played = None
+    if lines is not None:
+        played = next((line for line in lines if line.get("pv") and line["pv"][0] == move), None)
+        if played is not None:
+            return lines[0], played
+
+    best = lines[0] if lines else _lookup_eval(board, limit)
+    after = board.copy(stack=False)
+    after.push(move)
+    after_info = None
+    if best is not None:
+        after_info = settle_trivial(after)
+        # A shallow speculative eval is only comparable with a best line searched at the same limit
+        if after_info is None and not lines:
+            after_info = _lookup_eval(after, limit)
+    if after_info is not None:
+        return best, {"score": after_info["score"], "pv": [move] + after_info.get("pv", []),
+                      "depth": after_info.get("depth")}
+
+    with _engine() as engine:
+        if lines is None:
+            lines = engine.analyse(board, limit, multipv=MOVE_GRADING_MULTIPV)
+            _remember_eval(board, limit, lines[0])
+            played = next((line for line in lines if line.get("pv") and line["pv"][0] == move), None)
+        if played is None:
+            played = engine.analyse(board, limit, root_moves=[move])
+    return lines[0], played
+
+
 # -------------------------
 # PGN Analysis
 # -------------------------
 
-def _analyze_pgn(pgn_string: str) -> Dict[str, Any]:
+def _outcome(score: int) -> int:
     """
-    The core PGN analysis logic.
-    This is a heavy operation!
+    1 for a won position (tablebase win or mate score), -1 for a lost one, else 0.
     """
-    try:
-        pgn_file = io.StringIO(pgn_string)
-        game = chess.pgn.read_game(pgn_file)
-        if game is None:
-            raise ValueError("Could not parse PGN.")
-    except Exception as e:
-        return {"error": f"Failed to read PGN: {e}"}
+    if score >= TABLEBASE_WIN_CP:
+        return 1
+    if score <= -TABLEBASE_WIN_CP:
+        return -1
+    return 0
+
 
+def _cp_loss(best_score: int, after_score: int,
+             info_before: Dict[str, Any], info_after: Dict[str, Any]) -> int:
+    """
+    Centipawn loss of a move from the mover's best and after scores. When a
+    tablebase result is involved and the move keeps the won/lost result (or
+    the tablebase draw), nothing is lost: tablebase scores are flat and do
+    not compare with mate scores from a search.
+    """
+    before_tb = info_before.get("depth") == TABLEBASE_DEPTH
+    after_tb = info_after.get("depth") == TABLEBASE_DEPTH
+    outcome = _outcome(best_score)
+    if (before_tb or after_tb) and outcome == _outcome(after_score) and (outcome or (before_tb and after_tb)):
+        return 0
+    return best_score - after_score
+
+
+def _grade_ply(board: chess.Board, move: chess.Move,
+               info_before: Dict[str, Any], info_after: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Grade one ply from the searches of the position before and after it.
+    `board` is the position before the move; it is left unchanged.
+    """
+    turn = board.turn
+    move_num = board.fullmove_number
+
+    # Best score and best move from the mover's POV
+    best_score_before = info_before["score"].pov(turn).score(mate_score=MATE_SCORE)
+    best_san = None
+    if "pv" in info_before and info_before["pv"]:
+        try:
+            best_san = board.san(info_before["pv"][0])
+        except Exception:
+            best_san = info_before["pv"][0].uci()
+
+    # Score after the move, still from the mover's POV
+    san_played = board.san(move)
+    after_score = info_after["score"].pov(turn).score(mate_score=MATE_SCORE)
+
+    # Handle mate scores
+    if best_score_before is None: best_score_before = 0
+    if after_score is None: after_score = 0
+
+    cp_loss = _cp_loss(best_score_before, after_score, info_before, info_after)
+    board_after = board.copy(stack=False)
+    board_after.push(move)
+
+    return {
+        "fen": board_after.fen(),
+        "eval": info_after["score"].white().score(mate_score=MATE_SCORE),
+        "label": f"{move_num}. {san_played}" if turn == chess.WHITE else f"{move_num}... {san_played}",
+        "move": {
+            "move_number": move_num,
+            "side": "White" if turn == chess.WHITE else "Black",
+            "san": san_played,
+            "best_san": best_san or "N/A",
+            "best_score": best_score_before,
+            "after_score": after_score,
+            "cp_loss": cp_loss,
+            "classification": classify_move(cp_loss),
+            # Settled by the endgame tablebase rather than an engine search
+            "tablebase": info_after.get("depth") == TABLEBASE_DEPTH,
+        },
+    }
+
+
+def _game_positions(game: chess.pgn.Game) -> List[chess.Board]:
+    """
+    Every distinct position of the mainline: the start position plus one per ply.
+    """
     board = game.board()
-    mainline_moves = list(game.mainline_moves())
+    positions = [board.copy()]
+    for move in game.mainline_moves():
+        board.push(move)
+        positions.append(board.copy())
+    return positions
 
-    fens = ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"]
-    evals_cp = [0]  # Eval *after* the move (from White's POV)
-    move_labels = []  # "1. e4", "1... e5", "2. Nf3"
-    analyzed_moves = []
 
-    with _engine() as engine:
-        for i, move in enumerate(mainline_moves):
-            turn = board.turn
-            side_str = "White" if turn == chess.WHITE else "Black"
-            move_num = board.fullmove_number
-
-            # 1. Get eval BEFORE this move
-            info_before = engine.analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS))
-            # Get score from the mover's POV
-            best_score_before = info_before["score"].pov(turn).score(mate_score=MATE_SCORE)
-            best_san = None
-            if "pv" in info_before and info_before["pv"]:
-                try:
-                    best_san = board.san(info_before["pv"][0])
-                except Exception:
-                    best_san = info_before["pv"][0].uci()
-
-            # 2. Make the move
-            san_played = board.san(move)
-            board.push(move)
-
-            # 3. Get eval AFTER this move
-            info_after = engine.analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS))
-            # Get score from the *previous* mover's POV
-            after_score = info_after["score"].pov(not board.turn).score(mate_score=MATE_SCORE)
-
-            # 4. Calculate loss and classify
-            # (Handle mate scores)
-            if best_score_before is None: best_score_before = 0
-            if after_score is None: after_score = 0
-
-            cp_loss = best_score_before - after_score
-            classification = classify_move(cp_loss)
-
-            # Store data for chart/table
-            fens.append(board.fen())
-            evals_cp.append(info_after["score"].white().score(mate_score=MATE_SCORE))
-
-            label = f"{move_num}. {san_played}" if turn == chess.WHITE else f"{move_num}... {san_played}"
-            move_labels.append(label)
-
-            analyzed_moves.append({
-                "move_number": move_num,
-                "side": side_str,
-                "san": san_played,
-                "best_san": best_san or "N/A",
-                "best_score": best_score_before,
-                "after_score": after_score,
-                "cp_loss": cp_loss,
-                "classification": classification,
-            })
-
-    game_info = {
+def _iter_search_segment(positions: List[chess.Board], limit: chess.engine.Limit,
+                         progress: Optional[Callable[[int], None]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Search each position once, in order, yielding each result as it is ready.
+    Every search checks an engine out at "batch" priority and returns it, so live
+    play waits at most one position's search; the pool hands back the engine
+    released last, so consecutive positions usually keep its transposition table warm.
+    Cached and trivial positions are skipped without checking out an engine.
+    `progress(n)` is called as positions are finished.
+    """
+    for board in positions:
+        info = _analyse(board, limit, priority="batch")
+        if progress:
+            progress(1)
+        yield info
+
+
+def _split_segments(count: int, segments: int) -> List[range]:
+    """
+    Split `count` positions into at most `segments` contiguous, near-equal ranges.
+    """
+    segments = max(1, min(segments, count // ANALYSIS_MIN_SEGMENT_LENGTH))
+    bounds = [count * k // segments for k in range(segments + 1)]
+    return [range(bounds[k], bounds[k + 1]) for k in range(segments)]
+
+
+def _iter_search_positions(positions: List[chess.Board], limit: chess.engine.Limit, segments: int = 1,
+                           progress: Optional[Callable[[int, int], None]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Search every position once, spreading contiguous segments over several
+    pooled engines, and yield the results in position order as soon as each
+    one (and everything before it) is available.
+    `progress(n, total)` reports n more positions finished out of `total`.
+    """
+    report = None
+    if progress:
+        report = lambda n: progress(n, len(positions))
+
+    ranges = _split_segments(len(positions), segments)
+    if len(ranges) <= 1:
+        yield from _iter_search_segment(positions, limit, report)
+        return
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(positions)
+    ready = threading.Condition()
+
+    def run(r: range) -> None:
+        for offset, info in enumerate(_iter_search_segment(positions[r.start:r.stop], limit, report)):
+            with ready:
+                results[r.start + offset] = info
+                ready.notify_all()
+
+    def wake(_future) -> None:
+        with ready:
+            ready.notify_all()
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(run, r) for r in ranges]
+        for future in futures:
+            future.add_done_callback(wake)
+
+        for i in range(len(positions)):
+            with ready:
+                while results[i] is None:
+                    failed = next((f for f in futures if f.done() and f.exception()), None)
+                    if failed is not None:
+                        raise failed.exception()
+                    ready.wait()
+                info = results[i]
+            yield info
+
+
+def _game_info(game: chess.pgn.Game) -> Dict[str, str]:
+    return {
         "white": game.headers.get("White", "Unknown"),
         "black": game.headers.get("Black", "Unknown"),
         "event": game.headers.get("Event", "Unknown Event"),
@@ -201,14 +863,352 @@ def _analyze_pgn(pgn_string: str) -> Dict[str, Any]:
         "result": game.headers.get("Result", "*"),
     }
 
+
+def _searches_avoided(game: chess.pgn.Game) -> int:
+    """
+    How many of the game's positions the trivial-position fast path settles without a search.
+    """
+    return sum(1 for board in _game_positions(game)
+               if settle_trivial(board) is not None or forced_move(board) is not None)
+
+
+def _assemble_analysis(game: chess.pgn.Game, plies: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build the review page payload from graded plies.
+    """
     return {
         "ok": True,
-        "game_info": game_info,
-        "moves": analyzed_moves,
-        "fens": fens,
-        "evals": evals_cp,
-        "move_labels": move_labels,
+        "searches_avoided": _searches_avoided(game),
+        "tablebase_plies": sum(1 for p in plies if p["move"]["tablebase"]),
+        "game_info": _game_info(game),
+        "moves": [p["move"] for p in plies],
+        "fens": [START_FEN] + [p["fen"] for p in plies],
+        "evals": [0] + [p["eval"] for p in plies],  # Eval *after* each move (from White's POV)
+        "move_labels": [p["label"] for p in plies],  # "1. e4", "1... e5", "2. Nf3"
+    }
+
+
+def _critical_positions(positions: List[chess.Board], moves: List[chess.Move],
+                        infos: List[Dict[str, Any]], budget: float, deep_time: float) -> List[int]:
+    """
+    Pick the positions worth a deep re-search, most critical plies first,
+    until `budget` seconds of `deep_time` searches are spent.
+    A ply is critical if it looks like a mistake, swings the eval, or involves a mate score.
+    """
+    candidates = []
+    for i, move in enumerate(moves):
+        graded = _grade_ply(positions[i], move, infos[i], infos[i + 1])["move"]
+        before = infos[i]["score"].white()
+        after = infos[i + 1]["score"].white()
+        swing = abs(after.score(mate_score=MATE_SCORE) - before.score(mate_score=MATE_SCORE))
+        sharp = before.is_mate() or after.is_mate()
+        if graded["cp_loss"] >= ANALYSIS_CRITICAL_CP_LOSS or swing >= ANALYSIS_CRITICAL_SWING or sharp:
+            candidates.append((max(graded["cp_loss"], swing), i))
+
+    chosen = set()
+    spent = 0.0
+    for _, i in sorted(candidates, reverse=True):
+        # Both sides of the ply are needed to re-grade it; shared positions are paid once
+        new = {i, i + 1} - chosen
+        cost = len(new) * deep_time
+        if spent + cost > budget:
+            continue
+        chosen |= new
+        spent += cost
+    return sorted(chosen)
+
+
+def _adaptive_search(positions: List[chess.Board], moves: List[chess.Move], segments: int,
+                     progress: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Two-pass search under a fixed per-game budget: a shallow pass over every
+    position, then full-depth re-searches of the critical plies only.
+    """
+    shallow = chess.engine.Limit(time=ANALYSIS_SHALLOW_TIME)
+    deep = chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS)
+    deep_budget = max(0.0, ANALYSIS_BUDGET_SECONDS - len(positions) * ANALYSIS_SHALLOW_TIME)
+
+    # Progress total is an estimate until the critical plies are known
+    total = len(positions) + min(len(positions), int(deep_budget / ENGINE_TIME_PER_ANALYSIS))
+    report = (lambda n, _: progress(n, total)) if progress else None
+    infos = list(_iter_search_positions(positions, shallow, segments, report))
+
+    critical = _critical_positions(positions, moves, infos, deep_budget, ENGINE_TIME_PER_ANALYSIS)
+    total = len(positions) + len(critical)
+    deep_infos = _iter_search_positions([positions[i] for i in critical], deep, segments, report)
+    for i, info in zip(critical, deep_infos):
+        infos[i] = info
+    return infos
+
+
+def _iter_analysis(game: chess.pgn.Game, segments: int = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   mode: str = None, prefix: List[Dict[str, Any]] = ()) -> Iterator[Dict[str, Any]]:
+    """
+    Generator pipeline over the mainline: yields each graded ply as soon as
+    the searches of the positions before and after it are done.
+    In "adaptive" mode all searches finish before the first ply is yielded.
+    `prefix` holds already graded first plies ("uniform" mode only); only the
+    positions after them are searched.
+    """
+    if segments is None:
+        segments = ANALYSIS_SEGMENTS
+    if mode is None:
+        mode = ANALYSIS_MODE
+    positions = _game_positions(game)
+    if mode == "adaptive":
+        infos = _adaptive_search(positions, list(game.mainline_moves()), segments, progress)
+        for i, move in enumerate(game.mainline_moves()):
+            yield _grade_ply(positions[i], move, infos[i], infos[i + 1])
+        return
+
+    moves = list(game.mainline_moves())
+    yield from prefix
+    start = len(prefix)
+    if start == len(moves):
+        return
+
+    limit = chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS)
+    infos = _iter_search_positions(positions[start:], limit, segments, progress)
+    try:
+        info_before = next(infos)
+        for i in range(start, len(moves)):
+            move = moves[i]
+            info_after = next(infos)
+            yield _grade_ply(positions[i], move, info_before, info_after)
+            info_before = info_after
+    finally:
+        infos.close()
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def _get_result_cache() -> Optional[ResultCache]:
+    global _result_cache
+    if _result_cache is None and ANALYSIS_CACHE_DIR:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(ANALYSIS_CACHE_DIR, max_files=ANALYSIS_CACHE_MAX_FILES)
+    return _result_cache
+
+
+def _analysis_settings(mode: str) -> Dict[str, Any]:
+    """
+    Every setting that changes the analysis of a game.
+    """
+    settings = {
+        "version": ANALYSIS_CACHE_VERSION,
+        "mode": mode,
+        "time": ENGINE_TIME_PER_ANALYSIS,
+        "mate_score": MATE_SCORE,
+        "early_stop": [ENGINE_EARLY_STOP, EARLY_STOP_ITERATIONS, EARLY_STOP_SCORE_MARGIN, EARLY_STOP_MIN_DEPTH],
+        "tablebase": bool(SYZYGY_PATH),
     }
+    if mode == "adaptive":
+        settings["adaptive"] = [ANALYSIS_BUDGET_SECONDS, ANALYSIS_SHALLOW_TIME,
+                                ANALYSIS_CRITICAL_CP_LOSS, ANALYSIS_CRITICAL_SWING]
+    return settings
+
+
+def _analysis_key(game: chess.pgn.Game, mode: str) -> str:
+    """
+    Content hash of the game's mainline (start position + UCI moves) and of every
+    setting that changes the analysis. Headers, comments and variations don't count.
+    """
+    normalized = json.dumps({
+        "fen": game.board().fen(),
+        "moves": [move.uci() for move in game.mainline_moves()],
+        "settings": _analysis_settings(mode),
+    }, sort_keys=True)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+_ply_trie = PlyTrie(ANALYSIS_PREFIX_MAX_PLIES)
+
+
+def _prefix_root(game: chess.pgn.Game, mode: str) -> str:
+    """
+    The ply trie a game belongs to: its start position and analysis settings.
+    """
+    return json.dumps({"fen": game.board().fen(), "settings": _analysis_settings(mode)}, sort_keys=True)
+
+
+def _cached_result(game: chess.pgn.Game, mode: str) -> Optional[Dict[str, Any]]:
+    """
+    A stored analysis of this game's mainline, with this game's own headers.
+    """
+    cache = _get_result_cache()
+    if cache is None:
+        return None
+    result = cache.get(_analysis_key(game, mode))
+    if result is not None:
+        result["game_info"] = _game_info(game)
+    return result
+
+
+def _cached_plies(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    The graded plies of a stored analysis, as `_grade_ply` produced them.
+    """
+    return [
+        {"fen": fen, "eval": eval_cp, "label": label, "move": move}
+        for move, fen, eval_cp, label in zip(result["moves"], result["fens"][1:],
+                                             result["evals"][1:], result["move_labels"])
+    ]
+
+
+def _cached_analysis(pgn_string: str) -> Optional[Dict[str, Any]]:
+    """
+    The stored analysis of a PGN, if its mainline has been analyzed before.
+    """
+    try:
+        game = _read_pgn(pgn_string)
+    except ValueError:
+        return None
+    return _cached_result(game, ANALYSIS_MODE)
+
+
+def _read_pgn(pgn_string: str) -> chess.pgn.Game:
+    game = chess.pgn.read_game(io.StringIO(pgn_string))
+    if game is None:
+        raise ValueError("Could not parse PGN.")
+    return game
+
+
+def _analyze_pgn(pgn_string: str, segments: int = None,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 mode: str = None) -> Dict[str, Any]:
+    """
+    The core PGN analysis logic.
+    This is a heavy operation!
+
+    Each position is searched exactly once: the search of the position after
+    ply N doubles as the "before" search of ply N+1. The game is split into
+    `segments` contiguous parts (default ANALYSIS_SEGMENTS) analyzed in parallel.
+    `progress(n, total)` is called as positions are searched, and
+    `publish(ply)` with each graded ply, in order, as soon as it is ready.
+    `mode` is "uniform" or "adaptive" (default ANALYSIS_MODE).
+    A game whose mainline was analyzed before is served from the result cache.
+    """
+    try:
+        game = _read_pgn(pgn_string)
+    except Exception as e:
+        return {"error": f"Failed to read PGN: {e}"}
+
+    mode = mode or ANALYSIS_MODE
+    cached = _cached_result(game, mode)
+    if cached is not None:
+        # A job following the stream still expects every ply
+        if publish:
+            for ply in _cached_plies(cached):
+                publish(ply)
+        return cached
+
+    # Plies graded before depend on the whole game's budget in adaptive mode
+    moves_uci = [move.uci() for move in game.mainline_moves()]
+    root = _prefix_root(game, mode)
+    prefix = _ply_trie.match(root, moves_uci) if mode == "uniform" else []
+
+    plies = []
+    for ply in _iter_analysis(game, segments, progress, mode, prefix):
+        plies.append(ply)
+        if publish:
+            publish(ply)
+    result = _assemble_analysis(game, plies)
+    result["reused_plies"] = len(prefix)
+    if mode == "uniform":
+        _ply_trie.insert(root, moves_uci, plies)
+
+    cache = _get_result_cache()
+    if cache is not None:
+        cache.put(_analysis_key(game, mode), {k: v for k, v in result.items() if k != "game_info"})
+    return result
+
+
+# -------------------------
+# Background analysis
+# -------------------------
+
+_analysis_jobs = JobQueue(
+    lambda pgn_string, progress, publish: _analyze_pgn(pgn_string, progress=progress, publish=publish),
+    workers=ANALYSIS_WORKERS,
+    max_queued=ANALYSIS_MAX_QUEUED,
+    keep_finished=ANALYSIS_KEEP_SECONDS,
+)
+
+
+def _submit_analysis(pgn_string: str):
+    """
+    Queue a PGN for analysis; identical PGN text shares one job.
+    """
+    key = hashlib.sha256(pgn_string.strip().encode("utf-8")).hexdigest()
+    return _analysis_jobs.submit(key, pgn_string)
+
+
+_warmed_up = False
+
+
+@app.before_request
+def _warm_up():
+    """
+    On the first request, queue the sample game unless its analysis is already stored.
+    """
+    global _warmed_up
+    if _warmed_up or not ANALYSIS_WARMUP:
+        return
+    _warmed_up = True
+    if _cached_analysis(OPERA_GAME_PGN) is None:
+        try:
+            _submit_analysis(OPERA_GAME_PGN)
+        except QueueFull:
+            pass
+
+
+# -------------------------
+# Admission control
+# -------------------------
+
+_admission = AdmissionController(
+    ADMISSION_MAX_ACTIVE,
+    max_queued=ADMISSION_MAX_QUEUED,
+    max_wait=ADMISSION_MAX_WAIT,
+    per_session=ADMISSION_PER_SESSION,
+    initial_service_time=2 * ENGINE_TIME_PER_MOVE,
+)
+
+
+def _busy_response(retry_after: int):
+    """
+    A 503 telling the client when to retry: JSON for API calls, plain text for pages.
+    """
+    headers = {"Retry-After": str(retry_after)}
+    if request.path.startswith("/api/"):
+        return jsonify({"ok": False, "error": "Server busy, try again shortly",
+                        "retry_after": retry_after}), 503, headers
+    return f"Server busy, try again in {retry_after}s", 503, headers
+
+
+def _engine_bound(view):
+    """
+    Run `view` only once admission control grants it a slot; answer 503 otherwise.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            with _admission.admit(_session_id()):
+                g.engine_deadline = time.monotonic() + ADMISSION_MAX_WAIT
+                return view(*args, **kwargs)
+        except Overloaded as e:
+            return _busy_response(e.retry_after)
+    return wrapper
+
+
+@app.errorhandler(EnginePoolTimeout)
+def _engine_pool_timeout(_error):
+    return _busy_response(max(1, int(ENGINE_TIME_PER_MOVE * ENGINE_POOL_SIZE) + 1))
 
 
 # -------------------------
@@ -224,6 +1224,7 @@ def home():
 
 
 @app.route("/play", methods=["GET"])
+@_engine_bound
 def play():
     """
     Open straight into the playable board.
@@ -234,24 +1235,29 @@ def play():
         color = "white"
 
     # Reset the session game and (if needed) let engine start
-    moves_uci = []
-    moves_uci = _maybe_engine_start(moves_uci, color)
-    _save_session_game(moves_uci, color)
-
-    board = _board_from_moves(moves_uci)
-    return render_template("play.html", fen=board.fen(), player_color=color)
+    board = chess.Board()
+    moves_uci = _maybe_engine_start([], color, board)
+    _start_ponder(board, color)
+    fen = board.fen()
+    _save_session_game(moves_uci, color, board, new_game=True)
+    return render_template("play.html", fen=fen, player_color=color)
 
 
 @app.route("/review-sample", methods=["GET"])
 def review_sample():
     """
-    Analyzes the hardcoded sample PGN and shows the review page.
+    Queues analysis of the hardcoded sample PGN and shows its review page.
     """
-    analysis_data = _analyze_pgn(OPERA_GAME_PGN)
-    if not analysis_data.get("ok"):
-        return f"Error analyzing sample PGN: {analysis_data.get('error')}", 500
+    result = _cached_analysis(OPERA_GAME_PGN)
+    if result is not None:
+        return render_template("review.html", **result)
 
-    return render_template("review.html", **analysis_data)
+    try:
+        job = _submit_analysis(OPERA_GAME_PGN)
+    except QueueFull as e:
+        return f"Analysis queue is full, try again shortly ({e})", 503
+
+    return redirect(url_for("analysis_job", job_id=job.id))
 
 
 @app.route("/analyze", methods=["POST"])
@@ -278,11 +1284,91 @@ def analyze():
     if not pgn_string.strip():
         pgn_string = OPERA_GAME_PGN
 
-    analysis_data = _analyze_pgn(pgn_string)
-    if not analysis_data.get("ok"):
-        return f"Error analyzing PGN: {analysis_data.get('error')}", 500
+    result = _cached_analysis(pgn_string)
+    if result is not None:
+        return render_template("review.html", **result)
+
+    try:
+        job = _submit_analysis(pgn_string)
+    except QueueFull as e:
+        return f"Analysis queue is full, try again shortly ({e})", 503
+
+    return redirect(url_for("analysis_job", job_id=job.id))
 
-    return render_template("review.html", **analysis_data)
+
+@app.route("/analysis/<job_id>", methods=["GET"])
+def analysis_job(job_id):
+    """
+    Show the review page of a finished analysis. While it is still running the
+    page starts empty and fills in from the job's event stream.
+    """
+    job = _analysis_jobs.get(job_id)
+    if job is None:
+        return "Analysis not found (it may have expired)", 404
+
+    if job.status == "failed":
+        return f"Error analyzing PGN: {job.error}", 500
+    if job.status != "done":
+        headers = chess.pgn.read_headers(io.StringIO(job.payload)) or chess.pgn.Headers()
+        return render_template(
+            "review.html",
+            game_info=_game_info(chess.pgn.Game(headers)),
+            moves=[],
+            fens=[START_FEN],
+            evals=[0],
+            move_labels=[],
+            stream_url=url_for("api_analysis_stream", job_id=job.id),
+        )
+
+    if not job.result.get("ok"):
+        return f"Error analyzing PGN: {job.result.get('error')}", 500
+    return render_template("review.html", **job.result)
+
+
+@app.route("/api/analysis/<job_id>", methods=["GET"])
+def api_analysis_job(job_id):
+    """
+    Poll the status and progress of a background analysis.
+    """
+    job = _analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Analysis not found"}), 404
+    return jsonify({"ok": True, **job.to_dict()})
+
+
+@app.route("/api/analysis/<job_id>/stream", methods=["GET"])
+def api_analysis_stream(job_id):
+    """
+    Server-Sent Events stream of a background analysis: one "ply" event per
+    graded move, in order, as soon as it is produced, then a final "done" event.
+    """
+    job = _analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Analysis not found"}), 404
+
+    def events():
+        sent = 0
+        while True:
+            plies, finished = _analysis_jobs.wait_partial(job, sent, ANALYSIS_STREAM_KEEPALIVE)
+            for ply in plies:
+                yield f"event: ply\ndata: {json.dumps(ply)}\n\n"
+            sent += len(plies)
+            if finished:
+                # A PGN that failed to parse still finishes "done", with an error result
+                done = job.to_dict()
+                result = job.result or {}
+                done["ok"] = job.status == "done" and bool(result.get("ok"))
+                done["error"] = done["error"] or result.get("error")
+                yield f"event: done\ndata: {json.dumps(done)}\n\n"
+                return
+            if not plies:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # -------------------------
@@ -290,19 +1376,22 @@ def analyze():
 # -------------------------
 
 @app.route("/api/new", methods=["POST"])
+@_engine_bound
 def api_new():
     color = (request.json or {}).get("color", "white")
     if color not in ("white", "black"):
         color = "white"
 
-    moves_uci = []
-    moves_uci = _maybe_engine_start(moves_uci, color)
-    _save_session_game(moves_uci, color)
-    board = _board_from_moves(moves_uci)
-    return jsonify({"ok": True, "fen": board.fen(), "player_color": color})
+    board = chess.Board()
+    moves_uci = _maybe_engine_start([], color, board)
+    _start_ponder(board, color)
+    fen = board.fen()
+    _save_session_game(moves_uci, color, board, new_game=True)
+    return jsonify({"ok": True, "fen": fen, "player_color": color})
 
 
 @app.route("/api/move", methods=["POST"])
+@_engine_bound
 def api_move():
     """
     Accept a player's UCI move, grade it, make engine reply, return updated FEN + info.
@@ -311,60 +1400,70 @@ def api_move():
     uci = data.get("uci", "")
 
     moves_uci, player_color = _load_session_game()
-    board = _board_from_moves(moves_uci)
+    board = _session_board(moves_uci)
 
     player_is_white = (player_color == "white")
     side_to_move_is_player = (board.turn == chess.WHITE and player_is_white) or (
             board.turn == chess.BLACK and not player_is_white)
     if not side_to_move_is_player:
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "Not player's turn"}), 400
 
     try:
         move = chess.Move.from_uci(uci)
     except Exception:
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "Bad UCI"}), 400
 
     if move not in board.legal_moves:
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "Illegal move"}), 400
 
-    with _engine() as engine:
-        # Eval BEFORE (mover's POV)
-        info_before = engine.analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_MOVE))
-        best_score_before = info_before["score"].pov(board.turn).score(mate_score=MATE_SCORE)
-        best_san = None
-        if "pv" in info_before and info_before["pv"]:
-            try:
-                best_san = board.san(info_before["pv"][0])
-            except Exception:
-                best_san = None
+    limit = chess.engine.Limit(time=ENGINE_TIME_PER_MOVE)
+    mover = board.turn
 
-        # Apply player's move
-        san_played = board.san(move)
-        board.push(move)
+    # One search grades the move: best line and the played move's line
+    info_before, played_line = _grade_live_move(board, move, limit, _take_ponder(board, move))
 
-        # Eval AFTER from mover's POV
-        info_after = engine.analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_MOVE))
-        after_score = info_after["score"].pov(not board.turn).score(mate_score=MATE_SCORE)
+    # Eval BEFORE (mover's POV)
+    best_score_before = info_before["score"].pov(mover).score(mate_score=MATE_SCORE)
+    best_san = None
+    if "pv" in info_before and info_before["pv"]:
+        try:
+            best_san = board.san(info_before["pv"][0])
+        except Exception:
+            best_san = None
 
-        # Handle mate scores
-        if best_score_before is None: best_score_before = 0
-        if after_score is None: after_score = 0
+    # Apply player's move
+    san_played = board.san(move)
+    board.push(move)
+    moves_uci.append(move.uci())
 
-        cp_loss = best_score_before - after_score
-        classification = classify_move(cp_loss)
+    # Eval AFTER from mover's POV, read off the played move's line
+    after_score = played_line["score"].pov(mover).score(mate_score=MATE_SCORE)
 
-        # Engine reply
-        engine_san = None
-        if not board.is_game_over():
-            reply = engine.play(board, chess.engine.Limit(time=ENGINE_TIME_PER_MOVE)).move
-            engine_san = board.san(reply)
-            board.push(reply)
+    # Handle mate scores
+    if best_score_before is None: best_score_before = 0
+    if after_score is None: after_score = 0
 
-    # Persist new state
-    moves_uci = [m.uci() for m in board.move_stack]
-    _save_session_game(moves_uci, player_color)
+    cp_loss = _cp_loss(best_score_before, after_score, info_before, played_line)
+    classification = classify_move(cp_loss)
 
-    return jsonify({
+    # Keep both evaluations with the game, for an instant post-game review
+    _record_live_evals(len(moves_uci) - 1, info_before, played_line)
+
+    # Engine reply: from the book, else the continuation of the played move's line
+    engine_san = None
+    if not board.is_game_over():
+        pv = played_line.get("pv", [])
+        reply = _engine_reply(board, limit, pv[1] if len(pv) > 1 else None)
+        engine_san = board.san(reply)
+        board.push(reply)
+        moves_uci.append(reply.uci())
+
+    # Persist new state
+    _start_ponder(board, player_color)
+    response = {
         "ok": True,
         "fen": board.fen(),
         "player_move": san_played,
@@ -374,66 +1473,93 @@ def api_move():
         "best_move": best_san,
         "game_over": board.is_game_over(),
         "result": board.result() if board.is_game_over() else None,
-    })
+    }
+    _save_session_game(moves_uci, player_color, board)
+    return jsonify(response)
+
+
+def _record_live_evals(index: int, info_before: Dict[str, Any], played_line: Dict[str, Any]) -> None:
+    """
+    Record the evaluations of the positions before and after the player's move
+    (at `index` and `index + 1` plies) on the session's stored game.
+    The played line's second move is the engine's best reply.
+    """
+    game = g.get("stored_game")
+    if game is None:
+        return
+    best = info_before.get("pv") or [None]
+    pv = played_line.get("pv", [])
+    game.record_eval(index, info_before["score"].white().score(mate_score=MATE_SCORE),
+                     best[0].uci() if best[0] is not None else None)
+    game.record_eval(index + 1, played_line["score"].white().score(mate_score=MATE_SCORE),
+                     pv[1].uci() if len(pv) > 1 else None)
 
 
 @app.route("/api/undo", methods=["POST"])
+@_engine_bound
 def api_undo():
     """
     Retract the last full turn (engine reply + your previous move if present).
     """
     moves_uci, player_color = _load_session_game()
-    board = _board_from_moves(moves_uci)
+    board = _session_board(moves_uci)
 
     if not board.move_stack:
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "No moves to undo"}), 400
 
     # Pop two plies (full turn) if available; pop one if only one exists
     for _ in range(2):
         if board.move_stack:
             board.pop()
-
-    moves_uci = [m.uci() for m in board.move_stack]
+            moves_uci.pop()
 
     # ***FIX***: If we undid back to the engine's turn (e.g., player is Black),
     # we must make the engine move again.
-    moves_uci = _maybe_engine_start(moves_uci, player_color)
+    moves_uci = _maybe_engine_start(moves_uci, player_color, board)
 
-    _save_session_game(moves_uci, player_color)
-    board = _board_from_moves(moves_uci)  # Re-create board from new stack
+    _start_ponder(board, player_color)
+    fen = board.fen()
+    _save_session_game(moves_uci, player_color, board)
 
-    return jsonify({"ok": True, "fen": board.fen()})
+    return jsonify({"ok": True, "fen": fen})
 
 
 @app.route("/api/hint", methods=["POST"])
+@_engine_bound
 def api_hint():
     """
     Return the best move for the current position (player's turn).
     """
     moves_uci, player_color = _load_session_game()
-    board = _board_from_moves(moves_uci)
+    board = _session_board(moves_uci)
 
     player_is_white = (player_color == "white")
     side_to_move_is_player = (board.turn == chess.WHITE and player_is_white) or (
             board.turn == chess.BLACK and not player_is_white)
 
     if not side_to_move_is_player:
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "Not player's turn"}), 400
 
     if board.is_game_over():
+        _save_session_game(moves_uci, player_color, board)
         return jsonify({"ok": False, "error": "Game is over"}), 400
 
-    with _engine() as engine:
-        info = engine.analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS))
+    # A deep enough ponder answers at once; pondering resumes after the hint
+    lines = _take_ponder(board)
+    info = lines[0] if lines else _analyse(board, chess.engine.Limit(time=ENGINE_TIME_PER_ANALYSIS), priority="hint")
+    _start_ponder(board, player_color)
 
-        best_move = None
-        best_san = None
-        eval_cp = None
+    best_move = None
+    best_san = None
+    eval_cp = None
 
-        if "pv" in info and info["pv"]:
-            best_move = info["pv"][0]
-            best_san = board.san(best_move)
-            eval_cp = info["score"].pov(board.turn).score(mate_score=MATE_SCORE)
+    if "pv" in info and info["pv"]:
+        best_move = info["pv"][0]
+        best_san = board.san(best_move)
+        eval_cp = info["score"].pov(board.turn).score(mate_score=MATE_SCORE)
+    _save_session_game(moves_uci, player_color, board)
 
     if not best_move:
         return jsonify({"ok": False, "error": "Could not find best move"}), 500
@@ -448,35 +1574,188 @@ def api_hint():
     })
 
 
+def _live_game_pgn(board: chess.Board, player_color: str) -> chess.pgn.Game:
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "Live game"
+    game.headers["Site"] = ""
+    game.headers["White"] = "You" if player_color == "white" else "Engine"
+    game.headers["Black"] = "Engine" if player_color == "white" else "You"
+    return game
+
+
+def _recorded_info(white_cp: int, best_uci: Optional[str]) -> Dict[str, Any]:
+    """
+    An `analyse`-style result rebuilt from a recorded evaluation.
+    """
+    return {
+        "score": chess.engine.PovScore(chess.engine.Cp(white_cp), chess.WHITE),
+        "pv": [chess.Move.from_uci(best_uci)] if best_uci else [],
+    }
+
+
+@app.route("/review-game", methods=["GET"])
+@_engine_bound
+def review_game():
+    """
+    Review the session's live game from the evaluations recorded while it was
+    played; only positions without one are searched, at REVIEW_BACKFILL_TIME.
+    """
+    moves_uci, player_color = _load_session_game()
+    stored = g.get("stored_game")
+    if stored is None:
+        return redirect(url_for("play"))
+    board = _session_board(moves_uci)
+    game = _live_game_pgn(board, player_color)
+    _board_cache.put(_session_id(), moves_uci, board)
+
+    positions = _game_positions(game)
+    limit = chess.engine.Limit(time=REVIEW_BACKFILL_TIME)
+    backfilled = 0
+    infos = []
+    for i, position in enumerate(positions):
+        if i not in stored.evals:
+            info = _analyse(position, limit, priority="hint")
+            pv = info.get("pv") or [None]
+            stored.record_eval(i, info["score"].white().score(mate_score=MATE_SCORE),
+                               pv[0].uci() if pv[0] is not None else None)
+            backfilled += 1
+        infos.append(_recorded_info(*stored.evals[i]))
+    if backfilled:
+        _get_game_store().save(stored)
+
+    plies = [_grade_ply(positions[i], move, infos[i], infos[i + 1])
+             for i, move in enumerate(game.mainline_moves())]
+    result = _assemble_analysis(game, plies)
+    result["backfilled_plies"] = backfilled
+    return render_template("review.html", **result)
+
+
+@app.route("/api/engine/stats", methods=["GET"])
+def api_engine_stats():
+    """
+    Report engine pool size, usage and queue depth, and evaluation cache counters.
+    """
+    store = _get_eval_store()
+    return jsonify({
+        "ok": True,
+        "pool": _get_engine_pool().stats(),
+        "admission": _admission.stats(),
+        "engine_loop": _engine_loop.stats() if _engine_loop is not None else None,
+        "early_stop": _search_stats.stats(),
+        "trivial": _trivial_stats.stats(),
+        "tablebase": _get_tablebase().stats() if _get_tablebase() is not None else None,
+        "ponder": _get_ponderer().stats(),
+        "eval_cache": _eval_cache.stats(),
+        "eval_store": store.stats() if store is not None else None,
+        "board_cache": _board_cache.stats(),
+        "game_store": _get_game_store().stats(),
+        "book": dict(_book_stats),
+        "analysis_jobs": _analysis_jobs.stats(),
+        "analysis_cache": _get_result_cache().stats() if _get_result_cache() is not None else None,
+        "analysis_prefixes": _ply_trie.stats(),
+    })
+
+
 # -------------------------
 # Opening Trainer Routes
 # -------------------------
 
+_opening_index = None
+_opening_index_lock = threading.Lock()
+
+
+def _get_opening_index():
+    """
+    Every position of every opening line, keyed by Zobrist hash, plus the openings themselves.
+    Loaded on first use so processes that never open the trainer don't pay for it.
+    """
+    global _opening_index
+    if _opening_index is None:
+        with _opening_index_lock:
+            if _opening_index is None:
+                source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openings_data.py")
+                _opening_index = load_index(OPENINGS_INDEX_PATH, source)
+    return _opening_index
+
+
+def _opening_line_index(opening: Dict[str, Any], value) -> int:
+    try:
+        line_index = int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return line_index if 0 <= line_index < len(opening["lines"]) else 0
+
+
+def _opening_board(line: Dict[str, Any], move_index: int, fen: Optional[str]) -> chess.Board:
+    """
+    The trainer's current position: `fen` if the client sent one, else `line` replayed to `move_index`.
+    """
+    if fen:
+        return chess.Board(fen)
+    board = chess.Board()
+    for entry in line["moves"][:move_index]:
+        board.push_san(entry["san"])
+    return board
+
+
+def _expected_opening_move(board: chess.Board, line: Dict[str, Any], move_index: int, opening_id: str):
+    """
+    The book move to play from `board`: the line's own move if it applies here,
+    else any move of `opening_id` from this position (after a transposition).
+    Returns (san, comment), or None when out of book.
+    """
+    if move_index < len(line["moves"]):
+        entry = line["moves"][move_index]
+        try:
+            move = board.parse_san(entry["san"])
+        except ValueError:
+            move = None
+        if move is not None and _get_opening_index().lookup(board, move, opening_id) is not None:
+            return entry["san"], entry.get("comment", "")
+    book_moves = _get_opening_index().book_moves(board, opening_id)
+    if not book_moves:
+        return None
+    return book_moves[0].san, _get_opening_index().comment(board, book_moves[0].move, opening_id)
+
+
+def _openings_reached(board: chess.Board) -> List[Dict[str, str]]:
+    """
+    The openings with a line passing through `board` ("which opening am I in").
+    """
+    index = _get_opening_index()
+    opening_ids = dict.fromkeys(opening_id for opening_id, _, _ in index.openings_at(board))
+    if not opening_ids:
+        return []
+    openings = index.openings()
+    return [{"id": opening_id, "name": openings[opening_id]["name"]} for opening_id in opening_ids]
+
+
 @app.route("/openings", methods=["GET"])
 def openings_list():
     """
     Show list of available openings to practice.
     """
-    return render_template("openings.html", openings=OPENINGS_DATABASE)
+    return render_template("openings.html", openings=_get_opening_index().openings())
 
 
 @app.route("/openings/<opening_id>", methods=["GET"])
 def opening_trainer(opening_id):
     """
-    Practice a specific opening.
+    Practice a specific opening. Use ?line=N to pick one of its variations (default = first).
     """
-    if opening_id not in OPENINGS_DATABASE:
+    opening = _get_opening_index().opening(opening_id)
+    if opening is None:
         return "Opening not found", 404
 
-    opening = OPENINGS_DATABASE[opening_id]
-    # Use the first line for now (can be extended for multiple variations)
-    line = opening["lines"][0]
+    line_index = _opening_line_index(opening, request.args.get("line"))
+    line = opening["lines"][line_index]
 
     return render_template(
         "opening_trainer.html",
         opening_id=opening_id,
         opening=opening,
-        line=line
+        line=line,
+        line_index=line_index,
     )
 
 
@@ -487,17 +1766,19 @@ def opening_trainer(opening_id):
 @app.route("/api/openings/<opening_id>/check", methods=["POST"])
 def check_opening_move(opening_id):
     """
-    Check if the player's move matches the opening line.
+    Check if the player's move is a book move of this opening.
+    Any move of any of its lines from the current position counts, so
+    transpositions are accepted.
     """
-    if opening_id not in OPENINGS_DATABASE:
+    opening = _get_opening_index().opening(opening_id)
+    if opening is None:
         return jsonify({"ok": False, "error": "Opening not found"}), 404
 
     data = request.json or {}
     move_san = data.get("move_san", "")
     move_index = data.get("move_index", 0)
 
-    opening = OPENINGS_DATABASE[opening_id]
-    line = opening["lines"][0]  # Using first line
+    line = opening["lines"][_opening_line_index(opening, data.get("line"))]
 
     if move_index >= len(line["moves"]):
         return jsonify({
@@ -507,19 +1788,34 @@ def check_opening_move(opening_id):
             "message": "Congratulations! You've completed this opening!"
         })
 
-    expected_move = line["moves"][move_index]
-    is_correct = move_san == expected_move["san"]
+    try:
+        board = _opening_board(line, move_index, data.get("fen"))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Bad FEN"}), 400
+
+    try:
+        move = board.parse_san(move_san)
+    except ValueError:
+        move = None
+    book_move = _get_opening_index().lookup(board, move, opening_id) if move is not None else None
+    is_correct = book_move is not None
+
+    expected = _expected_opening_move(board, line, move_index, opening_id)
+    expected_san, expected_comment = expected if expected else (line["moves"][move_index]["san"], "")
 
     response = {
         "ok": True,
         "correct": is_correct,
-        "expected_move": expected_move["san"],
-        "comment": expected_move.get("comment", ""),
+        "expected_move": expected_san,
+        "comment": _get_opening_index().comment(board, move, opening_id) if is_correct else expected_comment,
         "completed": False
     }
 
-    if not is_correct:
-        response["message"] = f"Not quite! The correct move is {expected_move['san']}"
+    if is_correct:
+        board.push(move)
+        response["openings"] = _openings_reached(board)
+    else:
+        response["message"] = f"Not quite! The correct move is {expected_san}"
 
     return jsonify(response)
 
@@ -529,14 +1825,14 @@ def get_next_opening_move(opening_id):
     """
     Get the next move in the opening (for computer moves).
     """
-    if opening_id not in OPENINGS_DATABASE:
+    opening = _get_opening_index().opening(opening_id)
+    if opening is None:
         return jsonify({"ok": False, "error": "Opening not found"}), 404
 
     data = request.json or {}
     move_index = data.get("move_index", 0)
 
-    opening = OPENINGS_DATABASE[opening_id]
-    line = opening["lines"][0]
+    line = opening["lines"][_opening_line_index(opening, data.get("line"))]
 
     if move_index >= len(line["moves"]):
         return jsonify({
@@ -544,13 +1840,24 @@ def get_next_opening_move(opening_id):
             "completed": True
         })
 
-    next_move = line["moves"][move_index]
+    try:
+        board = _opening_board(line, move_index, data.get("fen"))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Bad FEN"}), 400
+
+    expected = _expected_opening_move(board, line, move_index, opening_id)
+    if expected is None:
+        return jsonify({
+            "ok": True,
+            "completed": True
+        })
+    san, comment = expected
 
     return jsonify({
         "ok": True,
-        "move": next_move["move"],
-        "san": next_move["san"],
-        "comment": next_move.get("comment", ""),
+        "move": san,
+        "san": san,
+        "comment": comment,
         "completed": False
     })
 
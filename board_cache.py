@@ -0,0 +1,137 @@
+"""
+Board Cache
+Keeps each live game's current `chess.Board` in memory between requests, so a
+move, undo or hint does not replay the whole game from the start position.
+
+Notes:
+- Entries are keyed by session id and remember the move list (and its hash)
+  the board was built from.
+- A lookup whose move list extends the cached one pushes the new plies; one
+  that is a prefix of it pops plies. Anything else replays from scratch.
+- `checkout()` hands the board itself to the caller (no copy) and `put()` gives
+  it back after the request has changed it, so two concurrent requests for the
+  same game never share a board.
+- Entries are evicted least-recently-used first once the memory budget is spent.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Sequence, Tuple
+
+import chess
+
+# Rough memory cost of a board and of each ply on its move stack
+BOARD_BASE_BYTES = 2048
+PLY_BYTES = 400
+
+
+class _Entry:
+    __slots__ = ("moves_hash", "moves", "board")
+
+    def __init__(self, moves: Tuple[str, ...], board: chess.Board):
+        self.moves_hash = hash(moves)
+        self.moves = moves
+        self.board = board
+
+    def size_bytes(self) -> int:
+        return BOARD_BASE_BYTES + PLY_BYTES * len(self.moves)
+
+
+class BoardCache:
+    """
+    Thread-safe LRU cache of one board per session, with a memory budget.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.advanced = 0
+        self.popped = 0
+        self.replays = 0
+        self.evictions = 0
+
+    def checkout(self, key: str, moves_uci: Sequence[str]) -> chess.Board:
+        """
+        Return a board at the position after `moves_uci`, taking it out of the cache.
+        """
+        moves = tuple(moves_uci)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size_bytes()
+
+        if entry is not None:
+            board = self._catch_up(entry, moves)
+            if board is not None:
+                return board
+
+        with self._lock:
+            self.replays += 1
+        board = chess.Board()
+        for u in moves:
+            board.push(chess.Move.from_uci(u))
+        return board
+
+    def put(self, key: str, moves_uci: Sequence[str], board: chess.Board) -> None:
+        """
+        Store `board` (the position after `moves_uci`) for `key`. The caller must not keep using it.
+        """
+        entry = _Entry(tuple(moves_uci), board)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size_bytes()
+            self._entries[key] = entry
+            self._bytes += entry.size_bytes()
+
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size_bytes()
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size_bytes()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.advanced + self.popped + self.replays
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "advanced": self.advanced,
+                "popped": self.popped,
+                "replays": self.replays,
+                "hit_rate": round((lookups - self.replays) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _catch_up(self, entry: _Entry, moves: Tuple[str, ...]):
+        """
+        Move the cached board to `moves` by pushing or popping plies, or return None.
+        """
+        old = entry.moves
+        board = entry.board
+        if hash(moves) == entry.moves_hash and moves == old:
+            counter = "hits"
+        elif len(moves) > len(old) and moves[:len(old)] == old:
+            for u in moves[len(old):]:
+                board.push(chess.Move.from_uci(u))
+            counter = "advanced"
+        elif len(moves) < len(old) and old[:len(moves)] == moves:
+            for _ in range(len(old) - len(moves)):
+                board.pop()
+            counter = "popped"
+        else:
+            return None
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        return board
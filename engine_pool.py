@@ -0,0 +1,368 @@
+"""
+Engine Pool
+Keeps a bounded set of long-lived UCI engine processes that request handlers
+check out and check in, instead of launching Stockfish on every request.
+
+Notes:
+- Engines are started lazily, up to `size` processes, and warmed up (UCI
+  handshake + a tiny search so the NNUE network is loaded) before first use.
+- On check-in an engine is health-checked with `ping()` and retired if it is
+  broken or has served `max_searches` searches; a fresh one replaces it on demand.
+- Given an `EngineLoop`, all processes are driven from its single event loop
+  rather than one background thread per engine (see engine_loop.py).
+- Checkouts are scheduled by priority class (PRIORITIES, most urgent first):
+  a free engine goes to the oldest waiter of the most urgent class, except
+  that waiting "batch" work gets at least one grant in every
+  1 / `batch_min_share`, so it is never starved. Batch work checks an
+  engine out per position, so a live move waits at most one search.
+- "background" (pondering) never waits: it only takes an engine through
+  `try_acquire`, and holds it until preempted. When an interactive or hint
+  request finds no engine free while background work holds one, the pool
+  calls the preemptor (see `set_preemptor`) to give one back.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import chess
+import chess.engine
+
+from engine_loop import EngineLoop
+
+
+PRIORITIES = ("interactive", "hint", "batch", "background")
+# Classes whose waiters may preempt background checkouts
+PREEMPTING = ("interactive", "hint")
+
+
+class EnginePoolTimeout(Exception):
+    """Raised when no engine became free within the checkout timeout."""
+
+
+class _ClassStats:
+    __slots__ = ("granted", "timed_out", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.granted = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class PooledEngine:
+    """
+    Thin wrapper around a SimpleEngine that counts searches.
+    Everything that is not a search is forwarded to the underlying engine.
+    """
+
+    def __init__(self, engine: chess.engine.SimpleEngine):
+        self.engine = engine
+        self.searches = 0
+        self.created_at = time.monotonic()
+        self.priority: Optional[str] = None  # class of the current checkout
+
+    def analyse(self, *args, **kwargs):
+        self.searches += 1
+        return self.engine.analyse(*args, **kwargs)
+
+    def analysis(self, *args, **kwargs):
+        self.searches += 1
+        return self.engine.analysis(*args, **kwargs)
+
+    def play(self, *args, **kwargs):
+        self.searches += 1
+        return self.engine.play(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+
+class EnginePool:
+    """
+    A thread-safe, bounded pool of warmed-up UCI engines.
+
+    Usage:
+        pool = EnginePool(path, size=2)
+        with pool.engine() as engine:
+            engine.analyse(board, chess.engine.Limit(time=0.1))
+    """
+
+    def __init__(self, path: str, size: int = 2, max_searches: int = 500,
+                 options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = 30.0,
+                 loop: Optional[EngineLoop] = None, batch_min_share: float = 0.2):
+        if size < 1:
+            raise ValueError("Engine pool size must be at least 1")
+        self.path = path
+        self.size = size
+        self.max_searches = max_searches
+        self.options = dict(options or {})
+        self.timeout = timeout
+        self.loop = loop
+
+        self._cond = threading.Condition()
+        self._idle: List[PooledEngine] = []
+        self._total = 0  # idle + checked out + being started
+        self._closed = False
+
+        # One FIFO of waiting checkouts per priority class
+        self._queues: Dict[str, Deque[object]] = {name: deque() for name in PRIORITIES}
+        self._class_stats = {name: _ClassStats() for name in PRIORITIES}
+        self._batch_every = math.ceil(1 / batch_min_share) if batch_min_share > 0 else 0
+        self._grants_since_batch = 0
+        self._held = {name: 0 for name in PRIORITIES}
+        self._preemptor: Optional[Callable[[], bool]] = None
+        self._preempted = 0
+
+        # Counters for stats()
+        self._started = 0
+        self._recycled = 0
+        self._discarded = 0
+
+    # -------------------------
+    # Engine lifecycle
+    # -------------------------
+
+    def _spawn(self) -> PooledEngine:
+        if self.loop is not None:
+            engine = self.loop.popen_uci(self.path)
+        else:
+            engine = chess.engine.SimpleEngine.popen_uci(self.path)
+        try:
+            if self.options:
+                engine.configure(self.options)
+            # Warm-up: a depth-1 search forces the network to load now,
+            # not on the first real request.
+            engine.analyse(chess.Board(), chess.engine.Limit(depth=1))
+        except Exception:
+            self._quit(engine)
+            raise
+        return PooledEngine(engine)
+
+    @staticmethod
+    def _quit(engine) -> None:
+        try:
+            engine.quit()
+        except Exception:
+            try:
+                engine.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_healthy(pooled: PooledEngine) -> bool:
+        try:
+            pooled.engine.ping()
+            return True
+        except Exception:
+            return False
+
+    # -------------------------
+    # Checkout / checkin
+    # -------------------------
+
+    def _next_class(self) -> Optional[str]:
+        """
+        The class whose oldest waiter gets the next free engine.
+        """
+        waiting = [name for name in PRIORITIES if self._queues[name]]
+        if not waiting:
+            return None
+        if (self._batch_every and "batch" in waiting and waiting[0] != "batch"
+                and self._grants_since_batch >= self._batch_every - 1):
+            return "batch"
+        return waiting[0]
+
+    def set_preemptor(self, preemptor: Callable[[], bool]) -> None:
+        """
+        `preemptor()` should give back one engine held by background work,
+        returning False if it had none to give.
+        """
+        self._preemptor = preemptor
+
+    def _maybe_preempt(self, priority: str) -> None:
+        if priority not in PREEMPTING or self._preemptor is None:
+            return
+        with self._cond:
+            starved = not self._idle and self._total >= self.size and self._held["background"] > 0
+        if starved and self._preemptor():
+            with self._cond:
+                self._preempted += 1
+
+    def _granted(self, priority: str, waited: float) -> None:
+        self._held[priority] += 1
+        stats = self._class_stats[priority]
+        stats.granted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        if priority == "batch":
+            self._grants_since_batch = 0
+        elif self._queues["batch"]:
+            self._grants_since_batch += 1
+
+    def acquire(self, timeout: Optional[float] = None, priority: str = "interactive") -> PooledEngine:
+        """
+        Check out an engine, starting a new process if the pool is not full.
+        Blocks until one is free and it is this caller's turn under the
+        priority schedule; raises EnginePoolTimeout after `timeout` seconds.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class {priority!r}")
+        if timeout is None:
+            timeout = self.timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        self._maybe_preempt(priority)
+
+        ticket = object()
+        queue = self._queues[priority]
+        with self._cond:
+            queue.append(ticket)
+            try:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Engine pool is closed")
+                    available = bool(self._idle) or self._total < self.size
+                    if available and queue[0] is ticket and self._next_class() == priority:
+                        queue.popleft()
+                        self._granted(priority, time.monotonic() - start)
+                        # Another engine may be free for the next waiter
+                        self._cond.notify_all()
+                        if self._idle:
+                            pooled = self._idle.pop()
+                            pooled.priority = priority
+                            return pooled
+                        self._total += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._class_stats[priority].timed_out += 1
+                        raise EnginePoolTimeout(f"No engine available after {timeout}s")
+                    self._cond.wait(remaining)
+            finally:
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    self._cond.notify_all()
+        return self._start_reserved(priority)
+
+    def try_acquire(self, reserve: int = 0, priority: str = "interactive") -> Optional[PooledEngine]:
+        """
+        Check out an engine without waiting, but only if nobody is queued and
+        more than `reserve` engines (idle or not yet started) are free.
+        The check and the checkout happen under one lock; returns None otherwise.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class {priority!r}")
+        with self._cond:
+            if self._closed or any(self._queues.values()):
+                return None
+            if len(self._idle) + self.size - self._total <= reserve:
+                return None
+            self._granted(priority, 0.0)
+            if self._idle:
+                pooled = self._idle.pop()
+                pooled.priority = priority
+                return pooled
+            self._total += 1
+        return self._start_reserved(priority)
+
+    def _start_reserved(self, priority: str) -> PooledEngine:
+        """
+        Start a process for a slot already counted in `_total`, granted to `priority`.
+        Runs outside the lock so other callers are not blocked.
+        """
+        try:
+            pooled = self._spawn()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._held[priority] -= 1
+                self._cond.notify_all()
+            raise
+        pooled.priority = priority
+        with self._cond:
+            self._started += 1
+        return pooled
+
+    def release(self, pooled: PooledEngine, healthy: bool = True) -> None:
+        """
+        Return an engine to the pool. Broken or worn-out engines are shut down.
+        """
+        broken = not healthy or not self._is_healthy(pooled)
+        worn_out = bool(self.max_searches) and pooled.searches >= self.max_searches
+        retire = broken or worn_out or self._closed
+
+        if retire:
+            self._quit(pooled.engine)
+
+        with self._cond:
+            if pooled.priority is not None:
+                self._held[pooled.priority] -= 1
+                pooled.priority = None
+            if retire:
+                self._total -= 1
+                if broken:
+                    self._discarded += 1
+                elif worn_out:
+                    self._recycled += 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify_all()
+
+    @contextmanager
+    def engine(self, timeout: Optional[float] = None, priority: str = "interactive"):
+        """
+        Context manager that checks an engine out and always checks it back in.
+        An engine that raised an engine error is treated as unhealthy.
+        """
+        pooled = self.acquire(timeout, priority)
+        healthy = True
+        try:
+            yield pooled
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            healthy = False
+            raise
+        finally:
+            self.release(pooled, healthy=healthy)
+
+    # -------------------------
+    # Introspection / shutdown
+    # -------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for name in PRIORITIES:
+                stats = self._class_stats[name]
+                classes[name] = {
+                    "waiting": len(self._queues[name]),
+                    "held": self._held[name],
+                    "granted": stats.granted,
+                    "timed_out": stats.timed_out,
+                    "mean_wait_ms": round(stats.total_wait * 1000 / stats.granted, 1) if stats.granted else 0.0,
+                    "max_wait_ms": round(stats.max_wait * 1000, 1),
+                }
+            return {
+                "size": self.size,
+                "running": self._total,
+                "idle": len(self._idle),
+                "busy": self._total - len(self._idle),
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "started": self._started,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "preempted": self._preempted,
+                "priorities": classes,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled.engine)
@@ -0,0 +1,157 @@
+"""
+Engine Search
+Search primitives layered on top of python-chess' engine API.
+
+Notes:
+- `analyse_until_stable` behaves like `engine.analyse`, but watches the
+  iterative-deepening output and stops early once the best move has stayed the
+  same for several iterations and the score has settled. The limit passed in
+  is still the hard cap.
+- `SearchStats` counts how often searches stopped early and how much of their
+  time budget that saved.
+- `settle_trivial` and `forced_move` answer positions that need no search at
+  all: game-over positions get an exact score, and a position with a single
+  legal move is worth whatever the position after that move is worth.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import chess
+import chess.engine
+
+
+class SearchStats:
+    """
+    Thread-safe counters for early-terminating searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.early_stops = 0
+        self.time_budget = 0.0
+        self.time_spent = 0.0
+
+    def record(self, limit: chess.engine.Limit, elapsed: float, stopped_early: bool) -> None:
+        with self._lock:
+            self.searches += 1
+            self.early_stops += int(stopped_early)
+            self.time_spent += elapsed
+            # Time savings are only meaningful for time-limited searches
+            self.time_budget += limit.time if limit.time is not None else elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "early_stops": self.early_stops,
+                "time_budget": round(self.time_budget, 3),
+                "time_spent": round(self.time_spent, 3),
+                "time_saved": round(max(0.0, self.time_budget - self.time_spent), 3),
+            }
+
+
+def analyse_until_stable(engine, board: chess.Board, limit: chess.engine.Limit,
+                         stable_iterations: int = 4, score_margin: int = 15, min_depth: int = 12,
+                         stats: SearchStats = None) -> Dict[str, Any]:
+    """
+    Search `board` up to `limit`, stopping as soon as the first PV move has been
+    the same for `stable_iterations` consecutive depths (at `min_depth` or deeper)
+    with the score moving by less than `score_margin` centipawns between them.
+    Returns the same info dict `engine.analyse` would.
+    """
+    start = time.monotonic()
+    stopped_early = False
+    last_depth = 0
+    last_move = None
+    last_score = None
+    streak = 0
+
+    with engine.analysis(board, limit) as analysis:
+        for info in analysis:
+            # One completed iteration = an exact-bound line with a PV at a new depth
+            depth = info.get("depth", 0)
+            if ("pv" not in info or not info["pv"] or "score" not in info or depth <= last_depth
+                    or info.get("lowerbound") or info.get("upperbound")):
+                continue
+            last_depth = depth
+
+            move = info["pv"][0]
+            score = info["score"].relative.score(mate_score=100000)
+            if move == last_move and abs(score - last_score) < score_margin:
+                streak += 1
+            else:
+                streak = 1
+            last_move, last_score = move, score
+
+            if depth >= min_depth and streak >= stable_iterations:
+                stopped_early = True
+                break
+
+        if stopped_early:
+            analysis.stop()
+        analysis.wait()
+        result = dict(analysis.info)
+
+    elapsed = time.monotonic() - start
+    if stats is not None:
+        stats.record(limit, elapsed, stopped_early)
+    return result
+
+
+# -------------------------
+# Positions that need no search
+# -------------------------
+
+def settle_trivial(board: chess.Board) -> Optional[Dict[str, Any]]:
+    """
+    An exact `analyse`-style result for positions where the game is over:
+    checkmate, stalemate, insufficient material, the 75-move rule and fivefold
+    repetition; None otherwise. A threefold repetition only allows a draw
+    claim, so play (and the search) goes on.
+    """
+    if board.is_checkmate():
+        score = chess.engine.Mate(0)
+    elif (board.is_stalemate() or board.is_insufficient_material()
+          or board.is_seventyfive_moves() or board.is_fivefold_repetition()):
+        score = chess.engine.Cp(0)
+    else:
+        return None
+    return {"score": chess.engine.PovScore(score, board.turn), "pv": [], "depth": 0}
+
+
+def forced_move(board: chess.Board) -> Optional[chess.Move]:
+    """
+    The only legal move in `board`, or None if there are none or several.
+    """
+    moves = iter(board.legal_moves)
+    first = next(moves, None)
+    if first is None or next(moves, None) is not None:
+        return None
+    return first
+
+
+class TrivialStats:
+    """
+    Thread-safe counts of searches avoided by `settle_trivial` and `forced_move`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.terminal = 0
+        self.forced = 0
+
+    def record(self, terminal: int = 0, forced: int = 0) -> None:
+        with self._lock:
+            self.terminal += terminal
+            self.forced += forced
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "terminal": self.terminal,
+                "forced": self.forced,
+                "searches_avoided": self.terminal + self.forced,
+            }
@@ -0,0 +1,156 @@
+"""
+Evaluation Cache
+An in-process cache of engine search results keyed by the Zobrist hash of the
+position, so positions that come up again (start position, opening lines, the
+sample game, positions revisited after undo) are not searched twice.
+
+Notes:
+- An entry only counts as a hit if it was searched at least as hard as the
+  current request asks for (depth, nodes and time of the stored search).
+- Entries are evicted least-recently-used first once the memory budget is spent.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import chess
+import chess.engine
+import chess.polyglot
+
+# Rough per-entry cost used for the memory budget (object + dict slot + score)
+ENTRY_OVERHEAD_BYTES = 400
+PV_MOVE_BYTES = 64
+
+
+class CachedEval:
+    """
+    One stored search result.
+    """
+    __slots__ = ("score", "pv", "depth", "nodes", "time", "limit")
+
+    def __init__(self, score: chess.engine.PovScore, pv, depth: int, nodes: int,
+                 time: float, limit: chess.engine.Limit):
+        self.score = score
+        self.pv = tuple(pv)
+        self.depth = depth
+        self.nodes = nodes
+        self.time = time
+        self.limit = limit
+
+    @classmethod
+    def from_info(cls, info: Dict[str, Any], limit: chess.engine.Limit) -> "CachedEval":
+        return cls(
+            score=info["score"],
+            pv=info.get("pv", ()),
+            depth=info.get("depth", 0),
+            nodes=info.get("nodes", 0),
+            # Time budget of the search; engines report time spent for other limits
+            time=limit.time if limit.time is not None else (info.get("time") or 0.0),
+            limit=limit,
+        )
+
+    def covers(self, limit: chess.engine.Limit) -> bool:
+        """
+        True if this result was searched at least as deeply as `limit` asks for.
+        """
+        if limit.depth is not None and (self.depth or 0) < limit.depth:
+            return False
+        if limit.nodes is not None and (self.nodes or 0) < limit.nodes:
+            return False
+        if limit.time is not None and self.time < limit.time:
+            return False
+        return True
+
+    def to_info(self) -> Dict[str, Any]:
+        """
+        The entry in the same shape as an `engine.analyse` result.
+        """
+        return {
+            "score": self.score,
+            "pv": list(self.pv),
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "time": self.time,
+        }
+
+    def size_bytes(self) -> int:
+        return ENTRY_OVERHEAD_BYTES + PV_MOVE_BYTES * len(self.pv)
+
+
+class EvalCache:
+    """
+    Thread-safe LRU cache of search results with a memory budget.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, CachedEval]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(board: chess.Board) -> int:
+        return chess.polyglot.zobrist_hash(board)
+
+    def get(self, board: chess.Board, limit: chess.engine.Limit) -> Optional[Dict[str, Any]]:
+        """
+        Return a stored `analyse`-style info dict if one covers `limit`, else None.
+        """
+        key = self.key(board)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.covers(limit):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.to_info()
+
+    def put(self, board: chess.Board, limit: chess.engine.Limit, info: Dict[str, Any]) -> None:
+        """
+        Store a search result, keeping the deeper of the old and new entries.
+        """
+        if "score" not in info:
+            return
+        self.put_entry(board, CachedEval.from_info(info, limit))
+
+    def put_entry(self, board: chess.Board, entry: CachedEval) -> None:
+        key = self.key(board)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                if (old.depth or 0) > (entry.depth or 0):
+                    self._entries.move_to_end(key)
+                    return
+                self._bytes -= old.size_bytes()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._bytes += entry.size_bytes()
+
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size_bytes()
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,221 @@
+"""
+Evaluation Store
+A persistent, SQLite-backed second tier behind the in-process evaluation cache.
+Several workers and processes share one database file, so a freshly started
+process can reuse evaluations the others have already computed.
+
+Notes:
+- The database runs in WAL mode so readers never block the (batched) writers.
+- Each row is the 64-bit Zobrist hash of the position plus a compact binary
+  record (see `encode_eval` / `decode_eval`) and a last-written timestamp.
+- `prune()` drops rows by age and caps the table size, oldest first.
+"""
+
+import sqlite3
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.engine
+
+from eval_cache import CachedEval, EvalCache
+
+# flags, score, depth, nodes, search time (ms)
+_HEADER = struct.Struct("<BiHQI")
+_MOVE = struct.Struct("<H")
+
+_FLAG_MATE = 1
+_FLAG_WHITE_POV = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evals (
+    key INTEGER PRIMARY KEY,
+    record BLOB NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evals_updated_at ON evals (updated_at);
+"""
+
+
+# -------------------------
+# Binary record format
+# -------------------------
+
+def encode_move(move: chess.Move) -> int:
+    """
+    Pack a move into 16 bits: from (6) | to (6) | promotion piece type (3).
+    """
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    promotion = (code >> 12) & 0x7
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, promotion or None)
+
+
+def encode_eval(entry: CachedEval) -> bytes:
+    pov_score = entry.score
+    flags = _FLAG_WHITE_POV if pov_score.turn == chess.WHITE else 0
+    score = pov_score.relative
+    if score.is_mate():
+        flags |= _FLAG_MATE
+        value = score.mate()
+    else:
+        value = score.score()
+    header = _HEADER.pack(flags, value, min(entry.depth or 0, 0xFFFF),
+                          entry.nodes or 0, round((entry.time or 0.0) * 1000))
+    return header + b"".join(_MOVE.pack(encode_move(m)) for m in entry.pv)
+
+
+def decode_eval(record: bytes) -> CachedEval:
+    flags, value, depth, nodes, time_ms = _HEADER.unpack_from(record)
+    search_time = time_ms / 1000
+    score = chess.engine.Mate(value) if flags & _FLAG_MATE else chess.engine.Cp(value)
+    turn = chess.WHITE if flags & _FLAG_WHITE_POV else chess.BLACK
+    pv = [decode_move(code) for (code,) in _MOVE.iter_unpack(record[_HEADER.size:])]
+    return CachedEval(
+        score=chess.engine.PovScore(score, turn),
+        pv=pv,
+        depth=depth,
+        nodes=nodes,
+        time=search_time,
+        limit=chess.engine.Limit(time=search_time or None),
+    )
+
+
+def _signed64(key: int) -> int:
+    """
+    SQLite integers are signed; store the unsigned Zobrist hash as its two's complement.
+    """
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+# -------------------------
+# Store
+# -------------------------
+
+class EvalStore:
+    """
+    Thread-safe handle on the shared evaluation database.
+    Writes are buffered and committed in batches.
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 2.0,
+                 max_age: Optional[float] = None, max_rows: Optional[int] = None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.max_rows = max_rows
+
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[bytes, int]] = {}
+        self._last_flush = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.prune()
+
+    def get(self, board: chess.Board, limit: chess.engine.Limit) -> Optional[CachedEval]:
+        """
+        Return the stored entry for `board` if it covers `limit`, else None.
+        """
+        key = _signed64(EvalCache.key(board))
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                record = pending[0]
+            else:
+                row = self._conn.execute("SELECT record FROM evals WHERE key = ?", (key,)).fetchone()
+                record = row[0] if row else None
+
+            entry = decode_eval(record) if record else None
+            if entry is None or not entry.covers(limit):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, board: chess.Board, entry: CachedEval) -> None:
+        """
+        Queue an entry for writing; the batch is committed once it is full or old enough.
+        """
+        key = _signed64(EvalCache.key(board))
+        with self._lock:
+            self._pending[key] = (encode_eval(entry), int(time.time()))
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        rows: List[Tuple[int, bytes, int]] = [(k, rec, ts) for k, (rec, ts) in self._pending.items()]
+        self._pending.clear()
+        # Keep the deeper record when another process already wrote this position
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, record, ts in rows:
+                row = self._conn.execute("SELECT record FROM evals WHERE key = ?", (key,)).fetchone()
+                if row and decode_eval(row[0]).depth > decode_eval(record).depth:
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO evals (key, record, updated_at) VALUES (?, ?, ?)",
+                    (key, record, ts),
+                )
+                self.writes += 1
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def prune(self, max_age: Optional[float] = None, max_rows: Optional[int] = None) -> int:
+        """
+        Delete rows older than `max_age` seconds, then the oldest rows beyond `max_rows`.
+        Returns the number of rows removed.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_rows = self.max_rows if max_rows is None else max_rows
+        removed = 0
+        with self._lock:
+            if max_age is not None:
+                cur = self._conn.execute("DELETE FROM evals WHERE updated_at < ?",
+                                         (int(time.time() - max_age),))
+                removed += cur.rowcount
+            if max_rows is not None:
+                cur = self._conn.execute(
+                    "DELETE FROM evals WHERE key IN ("
+                    " SELECT key FROM evals ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (max_rows,),
+                )
+                removed += cur.rowcount
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM evals").fetchone()[0]
+            return {
+                "rows": rows,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,261 @@
+"""
+Game Store
+Server-side state of live games, so the session cookie only has to carry an
+opaque game id and stays the same size however long the game runs.
+
+Notes:
+- A game is stored as its moves packed into 16-bit codes (see
+  `eval_store.encode_move`) plus the current FEN and Zobrist hash.
+- Evaluations computed during play are kept with the game, per position index:
+  the score from White's point of view and the best move found, so the game
+  can be reviewed afterwards without searching those positions again.
+- Backends are pluggable: `MemoryGameBackend` for a single process,
+  `SqliteGameBackend` when several workers must see the same games.
+- Games that have not been saved for `ttl` seconds expire.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+from eval_store import _signed64, decode_move, encode_move
+
+# game id, player colour, packed moves, fen, zobrist hash, last saved (unix time), evals JSON
+GameRow = Tuple[str, str, bytes, str, int, float, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    player_color TEXT NOT NULL,
+    moves BLOB NOT NULL,
+    fen TEXT NOT NULL,
+    zobrist INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    evals TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at);
+"""
+
+
+class StoredGame:
+    """
+    One live game.
+    """
+
+    def __init__(self, game_id: str, player_color: str = "white", moves: array = None,
+                 fen: str = chess.STARTING_FEN, zobrist: int = 0, updated_at: float = 0.0,
+                 evals: Dict[int, Tuple[int, Optional[str]]] = None):
+        self.game_id = game_id
+        self.player_color = player_color
+        self.moves = moves if moves is not None else array("H")
+        self.fen = fen
+        self.zobrist = zobrist
+        self.updated_at = updated_at
+        # position index -> (centipawns from White's POV, best move UCI or None)
+        self.evals: Dict[int, Tuple[int, Optional[str]]] = evals if evals is not None else {}
+
+    def moves_uci(self) -> List[str]:
+        return [decode_move(code).uci() for code in self.moves]
+
+    def set_position(self, moves_uci: List[str], board: chess.Board) -> None:
+        """
+        Record the game as `moves_uci`, with `board` the position after them.
+        """
+        moves = array("H", (encode_move(chess.Move.from_uci(u)) for u in moves_uci))
+        # Positions of the old move list past the moves both lists share are no
+        # longer in the game (taken back, possibly replayed differently). Indices
+        # past the old list can only have been recorded for the new moves.
+        common = 0
+        for old, new in zip(self.moves, moves):
+            if old != new:
+                break
+            common += 1
+        self.evals = {i: e for i, e in self.evals.items() if i <= common or i > len(self.moves)}
+        self.moves = moves
+        self.fen = board.fen()
+        self.zobrist = chess.polyglot.zobrist_hash(board)
+
+    def record_eval(self, index: int, white_cp: int, best_uci: Optional[str] = None) -> None:
+        """
+        Remember the evaluation of the position after `index` plies.
+        An already known best move is kept if none is given.
+        """
+        if best_uci is None and index in self.evals:
+            best_uci = self.evals[index][1]
+        self.evals[index] = (white_cp, best_uci)
+
+    def to_row(self) -> GameRow:
+        evals = json.dumps({str(i): list(e) for i, e in self.evals.items()}, separators=(",", ":"))
+        return (self.game_id, self.player_color, self.moves.tobytes(), self.fen, self.zobrist, self.updated_at, evals)
+
+    @classmethod
+    def from_row(cls, row: GameRow) -> "StoredGame":
+        game_id, player_color, packed, fen, zobrist, updated_at, evals = row
+        moves = array("H")
+        moves.frombytes(packed)
+        evals = {int(i): (e[0], e[1]) for i, e in json.loads(evals or "{}").items()}
+        return cls(game_id, player_color, moves, fen, zobrist, updated_at, evals)
+
+
+# -------------------------
+# Backends
+# -------------------------
+
+class MemoryGameBackend:
+    """
+    Games kept in a dict; only visible to the current process.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, GameRow] = {}
+        self._lock = threading.Lock()
+
+    def load(self, game_id: str) -> Optional[GameRow]:
+        with self._lock:
+            return self._rows.get(game_id)
+
+    def save(self, row: GameRow) -> None:
+        with self._lock:
+            self._rows[row[0]] = row
+
+    def delete(self, game_id: str) -> None:
+        with self._lock:
+            self._rows.pop(game_id, None)
+
+    def expire(self, cutoff: float) -> int:
+        with self._lock:
+            stale = [game_id for game_id, row in self._rows.items() if row[5] < cutoff]
+            for game_id in stale:
+                del self._rows[game_id]
+            return len(stale)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+
+class SqliteGameBackend:
+    """
+    Games kept in an SQLite database shared by all workers (WAL mode).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # Databases created before evaluations were stored lack the column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(games)")]
+        if "evals" not in columns:
+            self._conn.execute("ALTER TABLE games ADD COLUMN evals TEXT NOT NULL DEFAULT '{}'")
+
+    def load(self, game_id: str) -> Optional[GameRow]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT game_id, player_color, moves, fen, zobrist, updated_at, evals FROM games WHERE game_id = ?",
+                (game_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        game_id, player_color, moves, fen, zobrist, updated_at, evals = row
+        return game_id, player_color, moves, fen, zobrist % (1 << 64), updated_at, evals
+
+    def save(self, row: GameRow) -> None:
+        game_id, player_color, moves, fen, zobrist, updated_at, evals = row
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO games (game_id, player_color, moves, fen, zobrist, updated_at, evals)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (game_id, player_color, moves, fen, _signed64(zobrist), updated_at, evals),
+            )
+
+    def delete(self, game_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM games WHERE game_id = ?", (game_id,))
+
+    def expire(self, cutoff: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM games WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# -------------------------
+# Store
+# -------------------------
+
+class GameStore:
+    """
+    Creates, loads and saves games on `backend`, expiring them after `ttl` seconds.
+    """
+
+    def __init__(self, backend, ttl: float = 7 * 24 * 3600, expire_interval: float = 300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.expire_interval = expire_interval
+        self._last_expire = 0.0
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.expired = 0
+
+    def create(self, player_color: str = "white") -> StoredGame:
+        with self._lock:
+            self.created += 1
+        return StoredGame(uuid.uuid4().hex, player_color)
+
+    def get(self, game_id: Optional[str]) -> Optional[StoredGame]:
+        """
+        The game with `game_id`, or None if it does not exist or has expired.
+        """
+        if not game_id:
+            return None
+        row = self.backend.load(game_id)
+        if row is None:
+            return None
+        game = StoredGame.from_row(row)
+        if game.updated_at < time.time() - self.ttl:
+            return None
+        return game
+
+    def save(self, game: StoredGame) -> None:
+        game.updated_at = time.time()
+        self.backend.save(game.to_row())
+        self._maybe_expire()
+
+    def delete(self, game_id: str) -> None:
+        self.backend.delete(game_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "games": self.backend.count(),
+                "created": self.created,
+                "expired": self.expired,
+            }
+
+    def _maybe_expire(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_expire < self.expire_interval:
+                return
+            self._last_expire = now
+        removed = self.backend.expire(time.time() - self.ttl)
+        with self._lock:
+            self.expired += removed
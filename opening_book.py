@@ -0,0 +1,184 @@
+"""
+Opening Book
+Writes a Polyglot `.bin` opening book from OPENINGS_DATABASE (and optionally
+from PGN files), for live play to take engine replies from while in book.
+
+Notes:
+- Weights: every database line playing a move adds `LINE_WEIGHT`; every PGN
+  game adds 2 for a win and 1 for a draw by the side making the move.
+- Entries are sorted by position key, as the format requires, so readers can
+  binary-search the file. Reading is left to `chess.polyglot.open_reader`,
+  which memory-maps the book.
+- Build or rebuild from the command line:
+    python opening_book.py build [book.bin] [games.pgn ...]
+- The PGN files a book was built from are listed in a sidecar file
+  (`book.bin.sources`), so an automatic rebuild after openings_data.py
+  changes keeps them. If one of them has gone missing, the existing book is
+  used as it is rather than rebuilt without it.
+"""
+
+import json
+import os
+import struct
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+LINE_WEIGHT = 10
+MAX_WEIGHT = 0xFFFF
+
+# key, move, weight, learn (big-endian)
+_ENTRY = struct.Struct(">QHHI")
+
+
+def encode_polyglot_move(board: chess.Board, move: chess.Move) -> int:
+    """
+    Polyglot move encoding: to | from << 6 | promotion << 12, with castling
+    written as the king capturing its own rook.
+    """
+    to_square = move.to_square
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        to_square = chess.square(7 if board.is_kingside_castling(move) else 0, rank)
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+
+class BookBuilder:
+    """
+    Accumulates (position, move) weights, then writes them as a Polyglot book.
+    """
+
+    def __init__(self, max_ply: int = 30):
+        self.max_ply = max_ply
+        self._weights: Dict[Tuple[int, int], int] = {}
+
+    def add(self, board: chess.Board, move: chess.Move, weight: int) -> None:
+        if weight <= 0:
+            return
+        key = (chess.polyglot.zobrist_hash(board), encode_polyglot_move(board, move))
+        self._weights[key] = min(MAX_WEIGHT, self._weights.get(key, 0) + weight)
+
+    def add_database(self, database: Dict[str, Dict]) -> None:
+        for opening in database.values():
+            for line in opening.get("lines", []):
+                board = chess.Board()
+                for entry in line.get("moves", [])[:self.max_ply]:
+                    try:
+                        move = board.parse_san(entry["san"])
+                    except ValueError:
+                        break
+                    self.add(board, move, LINE_WEIGHT)
+                    board.push(move)
+
+    def add_pgn(self, handle) -> int:
+        """
+        Add the opening moves of every game in an open PGN file; returns the number of games.
+        """
+        games = 0
+        while True:
+            game = chess.pgn.read_game(handle)
+            if game is None:
+                return games
+            result = game.headers.get("Result", "*")
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                if ply >= self.max_ply:
+                    break
+                if result == "1/2-1/2":
+                    weight = 1
+                elif result == ("1-0" if board.turn == chess.WHITE else "0-1"):
+                    weight = 2
+                else:
+                    weight = 0
+                self.add(board, move, weight)
+                board.push(move)
+            games += 1
+
+    def write(self, path: str) -> int:
+        """
+        Write the book (atomically); returns the number of entries.
+        """
+        entries = sorted(self._weights.items(), key=lambda item: (item[0][0], -item[1]))
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            for (key, move), weight in entries:
+                f.write(_ENTRY.pack(key, move, weight, 0))
+        os.replace(tmp_path, path)
+        return len(entries)
+
+
+def build_book(path: str, database: Dict[str, Dict] = None, pgn_paths: Iterable[str] = (),
+               max_ply: int = 30) -> int:
+    """
+    Build a book from `database` (default OPENINGS_DATABASE) and any PGN files.
+    """
+    if database is None:
+        from openings_data import OPENINGS_DATABASE
+        database = OPENINGS_DATABASE
+    pgn_paths = [os.path.abspath(pgn_path) for pgn_path in pgn_paths]
+    builder = BookBuilder(max_ply)
+    builder.add_database(database)
+    for pgn_path in pgn_paths:
+        with open(pgn_path, encoding="utf-8", errors="replace") as handle:
+            builder.add_pgn(handle)
+    count = builder.write(path)
+    _write_sources(path, {"pgn": pgn_paths, "max_ply": max_ply})
+    return count
+
+
+def _sources_path(path: str) -> str:
+    return f"{path}.sources"
+
+
+def _write_sources(path: str, sources: Dict) -> None:
+    tmp_path = f"{_sources_path(path)}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sources, f)
+    os.replace(tmp_path, _sources_path(path))
+
+
+def _read_sources(path: str) -> Dict:
+    """
+    The PGN files and ply limit `path` was built from (none, for books built before the sidecar).
+    """
+    try:
+        with open(_sources_path(path), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"pgn": [], "max_ply": 30}
+
+
+def open_book(path: Optional[str], source_path: str = None):
+    """
+    Open the book at `path` for reading, building it first if it is missing or
+    older than `source_path` or one of the PGN files it was built from.
+    Rebuilds reuse those PGN files. Returns None if there is no usable book.
+    """
+    if not path:
+        return None
+    try:
+        sources = _read_sources(path)
+        pgn_paths = sources.get("pgn", [])
+        if not os.path.exists(path):
+            build_book(path, pgn_paths=[p for p in pgn_paths if os.path.exists(p)],
+                       max_ply=sources.get("max_ply", 30))
+        elif all(os.path.exists(p) for p in pgn_paths):
+            built = os.path.getmtime(path)
+            inputs = pgn_paths + ([source_path] if source_path is not None else [])
+            if any(os.path.getmtime(p) > built for p in inputs):
+                build_book(path, pgn_paths=pgn_paths, max_ply=sources.get("max_ply", 30))
+        return chess.polyglot.open_reader(path)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        sys.exit("usage: python opening_book.py build [book.bin] [games.pgn ...]")
+    out = sys.argv[2] if len(sys.argv) > 2 else "book.bin"
+    count = build_book(out, pgn_paths=sys.argv[3:])
+    print(f"wrote {out}: {count} entries")
@@ -0,0 +1,451 @@
+"""
+Opening Index
+A position-keyed view of OPENINGS_DATABASE: every position reached by any line
+of any opening, keyed by its Zobrist hash, with the book moves played from it.
+
+Notes:
+- Because lookups go by position rather than by move number, transpositions
+  and moves from alternative lines are recognised.
+- Each book move remembers every (opening id, line index, ply) that plays it,
+  so one lookup answers both "is this a book move" and "which opening is this".
+- Lines whose SAN does not replay legally are cut off at the bad move.
+- `compile_index()` writes the index, plus the openings themselves, to a
+  compact binary file. `MappedOpeningIndex` reads that file through mmap, so it
+  loads instantly and forked workers share its pages. The file can be
+  prebuilt with `python opening_index.py build`; `python opening_index.py bench`
+  compares the two ways of loading.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+from eval_store import decode_move, encode_move
+
+# (opening id, line index, ply index within the line)
+LineRef = Tuple[str, int, int]
+
+
+class BookMove:
+    """
+    One book move from one position, with the lines that play it and their comments.
+    """
+    __slots__ = ("move", "san", "lines", "comments")
+
+    def __init__(self, move: chess.Move, san: str):
+        self.move = move
+        self.san = san
+        self.lines: List[LineRef] = []
+        self.comments: List[str] = []
+
+    @property
+    def comment(self) -> str:
+        return self.comments[0] if self.comments else ""
+
+    def openings(self) -> List[str]:
+        return sorted({opening_id for opening_id, _, _ in self.lines})
+
+    def comment_for(self, opening_id: str) -> str:
+        """
+        The comment `opening_id`'s lines give this move, falling back to any line's.
+        """
+        for ref, comment in zip(self.lines, self.comments):
+            if ref[0] == opening_id:
+                return comment
+        return self.comment
+
+
+class _Lookups:
+    """
+    Queries shared by the in-memory and the memory-mapped index.
+    Subclasses provide `_book(key)` and `_reached(key)`.
+    """
+
+    @staticmethod
+    def key(board: chess.Board) -> int:
+        return chess.polyglot.zobrist_hash(board)
+
+    def _book(self, key: int) -> Dict[chess.Move, BookMove]:
+        raise NotImplementedError
+
+    def _reached(self, key: int) -> List[LineRef]:
+        raise NotImplementedError
+
+    def book_moves(self, board: chess.Board, opening_id: Optional[str] = None) -> List[BookMove]:
+        """
+        Book moves from `board`, optionally only those played in `opening_id`'s lines.
+        """
+        moves = self._book(self.key(board))
+        if opening_id is None:
+            return list(moves.values())
+        return [m for m in moves.values() if any(ref[0] == opening_id for ref in m.lines)]
+
+    def lookup(self, board: chess.Board, move: chess.Move, opening_id: Optional[str] = None) -> Optional[BookMove]:
+        """
+        The book entry for playing `move` from `board` (within `opening_id` if given), or None.
+        """
+        book_move = self._book(self.key(board)).get(move)
+        if book_move is None:
+            return None
+        if opening_id is not None and not any(ref[0] == opening_id for ref in book_move.lines):
+            return None
+        return book_move
+
+    def comment(self, board: chess.Board, move: chess.Move, opening_id: str) -> str:
+        """
+        The comment `opening_id`'s lines give for `move` from `board` (falls back to any line's).
+        """
+        book_move = self._book(self.key(board)).get(move)
+        return book_move.comment_for(opening_id) if book_move else ""
+
+    def openings_at(self, board: chess.Board) -> List[LineRef]:
+        """
+        Every (opening id, line index, ply) whose line passes through `board`.
+        """
+        return self._reached(self.key(board))
+
+
+# -------------------------
+# In-memory index
+# -------------------------
+
+class OpeningIndex(_Lookups):
+    """
+    Zobrist hash -> book moves (and the openings that reach each position), built in memory.
+    """
+
+    def __init__(self, database: Dict[str, Dict[str, Any]] = None):
+        self.database = database or {}
+        self._moves: Dict[int, Dict[chess.Move, BookMove]] = {}
+        self._reached_refs: Dict[int, List[LineRef]] = {}
+        self.skipped: List[Tuple[str, int, int, str]] = []
+
+    @classmethod
+    def build(cls, database: Dict[str, Dict[str, Any]]) -> "OpeningIndex":
+        index = cls(database)
+        for opening_id, opening in database.items():
+            for line_index, line in enumerate(opening.get("lines", [])):
+                index._add_line(opening_id, line_index, line)
+        return index
+
+    def _add_line(self, opening_id: str, line_index: int, line: Dict[str, Any]) -> None:
+        board = chess.Board()
+        for ply, entry in enumerate(line.get("moves", [])):
+            try:
+                move = board.parse_san(entry["san"])
+            except ValueError:
+                self.skipped.append((opening_id, line_index, ply, entry["san"]))
+                return
+            moves = self._moves.setdefault(self.key(board), {})
+            book_move = moves.get(move)
+            if book_move is None:
+                book_move = moves[move] = BookMove(move, entry["san"])
+            ref = (opening_id, line_index, ply)
+            book_move.lines.append(ref)
+            book_move.comments.append(entry.get("comment", ""))
+
+            board.push(move)
+            self._reached_refs.setdefault(self.key(board), []).append(ref)
+
+    def _book(self, key: int) -> Dict[chess.Move, BookMove]:
+        return self._moves.get(key, {})
+
+    def _reached(self, key: int) -> List[LineRef]:
+        return list(self._reached_refs.get(key, []))
+
+    def openings(self) -> Dict[str, Dict[str, Any]]:
+        return self.database
+
+    def opening(self, opening_id: str) -> Optional[Dict[str, Any]]:
+        return self.database.get(opening_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": "memory",
+            "positions": len(self._moves),
+            "book_moves": sum(len(moves) for moves in self._moves.values()),
+            "skipped_lines": len(self.skipped),
+        }
+
+
+# -------------------------
+# Binary file format
+# -------------------------
+#
+# header, then fixed-size record sections, then the string blob.
+# Sections are located by (offset, count) pairs in the header.
+#
+#   positions  key u64, first move u32, move count u32       (sorted by key)
+#   moves      san string u32, first ref u32, ref count u32, move code u16
+#   refs       opening u16, line u16, ply u16, comment string u32
+#   reached    key u64, first ref u32, ref count u32         (sorted by key)
+#   openings   id string u32, summary JSON string u32, full JSON string u32
+#   strings    end offset u32 of each string in the blob
+
+MAGIC = b"OPIX"
+VERSION = 1
+_SECTIONS = ("positions", "moves", "refs", "reached", "openings", "strings")
+_HEADER = struct.Struct("<4sHH" + "II" * len(_SECTIONS) + "I")
+_POSITION = struct.Struct("<QII")
+_MOVE = struct.Struct("<IIIH2x")
+_REF = struct.Struct("<HHHxxI")
+_OPENING = struct.Struct("<III")
+_STRING_END = struct.Struct("<I")
+
+
+def _opening_summary(opening: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What the openings list page shows; line names stand in for the full lines.
+    """
+    summary = {k: v for k, v in opening.items() if k != "lines"}
+    summary["lines"] = [{"name": line.get("name", "")} for line in opening.get("lines", [])]
+    return summary
+
+
+def compile_index(database: Dict[str, Dict[str, Any]], path: str) -> OpeningIndex:
+    """
+    Build the index for `database` and write it, with the openings, to `path`.
+    """
+    index = OpeningIndex.build(database)
+    opening_numbers = {opening_id: n for n, opening_id in enumerate(database)}
+
+    strings: List[bytes] = []
+    string_ids: Dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return string_ids[text]
+
+    def pack_ref(ref: LineRef, comment: str = "") -> bytes:
+        opening_id, line_index, ply = ref
+        return _REF.pack(opening_numbers[opening_id], line_index, ply, intern(comment))
+
+    positions, moves, refs, reached = [], [], [], []
+    for key in sorted(index._moves):
+        book = index._moves[key]
+        positions.append(_POSITION.pack(key, len(moves), len(book)))
+        for book_move in book.values():
+            moves.append(_MOVE.pack(intern(book_move.san), len(refs), len(book_move.lines),
+                                    encode_move(book_move.move)))
+            refs.extend(pack_ref(ref, comment) for ref, comment in zip(book_move.lines, book_move.comments))
+    for key in sorted(index._reached_refs):
+        line_refs = index._reached_refs[key]
+        reached.append(_POSITION.pack(key, len(refs), len(line_refs)))
+        refs.extend(pack_ref(ref) for ref in line_refs)
+
+    openings = [
+        _OPENING.pack(intern(opening_id),
+                      intern(json.dumps(_opening_summary(opening), ensure_ascii=False)),
+                      intern(json.dumps(opening, ensure_ascii=False)))
+        for opening_id, opening in database.items()
+    ]
+
+    ends, end = [], 0
+    for s in strings:
+        end += len(s)
+        ends.append(_STRING_END.pack(end))
+
+    sections = [positions, moves, refs, reached, openings, ends]
+    offset = _HEADER.size
+    layout = []
+    for records in sections:
+        layout += [offset, len(records)]
+        offset += sum(len(r) for r in records)
+    blob_offset = offset
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, *layout, blob_offset))
+        for records in sections:
+            f.write(b"".join(records))
+        f.write(b"".join(strings))
+    # Atomic, so a worker never maps a half-written file
+    os.replace(tmp_path, path)
+    return index
+
+
+# -------------------------
+# Memory-mapped index
+# -------------------------
+
+class MappedOpeningIndex(_Lookups):
+    """
+    Read-only index over a file written by `compile_index`, decoded on demand.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, *layout, self._blob = _HEADER.unpack_from(self._buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an opening index (version {VERSION})")
+        self._sections = {name: (layout[2 * i], layout[2 * i + 1]) for i, name in enumerate(_SECTIONS)}
+
+        self._opening_ids = [self._string(self._record("openings", _OPENING, n)[0])
+                             for n in range(self._sections["openings"][1])]
+        self._opening_numbers = {opening_id: n for n, opening_id in enumerate(self._opening_ids)}
+        # Sorted keys for binary search; 8 bytes each, a few KB in total
+        self._position_keys = self._keys("positions")
+        self._reached_keys = self._keys("reached")
+
+    def _record(self, section: str, record: struct.Struct, n: int):
+        offset, _ = self._sections[section]
+        return record.unpack_from(self._buf, offset + n * record.size)
+
+    def _keys(self, section: str) -> List[int]:
+        offset, count = self._sections[section]
+        return [key for key, _, _ in _POSITION.iter_unpack(self._buf[offset:offset + count * _POSITION.size])]
+
+    def _string(self, n: int) -> str:
+        start = self._record("strings", _STRING_END, n - 1)[0] if n else 0
+        end = self._record("strings", _STRING_END, n)[0]
+        return self._buf[self._blob + start:self._blob + end].decode("utf-8")
+
+    def _find(self, keys: List[int], section: str, key: int):
+        n = bisect.bisect_left(keys, key)
+        if n == len(keys) or keys[n] != key:
+            return None
+        return self._record(section, _POSITION, n)
+
+    def _refs(self, first: int, count: int) -> List[Tuple[LineRef, int]]:
+        refs = []
+        for n in range(first, first + count):
+            opening, line_index, ply, comment = self._record("refs", _REF, n)
+            refs.append(((self._opening_ids[opening], line_index, ply), comment))
+        return refs
+
+    def _book(self, key: int) -> Dict[chess.Move, BookMove]:
+        found = self._find(self._position_keys, "positions", key)
+        if found is None:
+            return {}
+        _, first_move, count = found
+        book = {}
+        for n in range(first_move, first_move + count):
+            san, first_ref, ref_count, code = self._record("moves", _MOVE, n)
+            book_move = BookMove(decode_move(code), self._string(san))
+            for ref, comment in self._refs(first_ref, ref_count):
+                book_move.lines.append(ref)
+                book_move.comments.append(self._string(comment))
+            book[book_move.move] = book_move
+        return book
+
+    def _reached(self, key: int) -> List[LineRef]:
+        found = self._find(self._reached_keys, "reached", key)
+        if found is None:
+            return []
+        _, first_ref, count = found
+        return [ref for ref, _ in self._refs(first_ref, count)]
+
+    def openings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Summaries of every opening (no move lists), in database order.
+        """
+        return {
+            opening_id: json.loads(self._string(self._record("openings", _OPENING, n)[1]))
+            for n, opening_id in enumerate(self._opening_ids)
+        }
+
+    def opening(self, opening_id: str) -> Optional[Dict[str, Any]]:
+        n = self._opening_numbers.get(opening_id)
+        if n is None:
+            return None
+        return json.loads(self._string(self._record("openings", _OPENING, n)[2]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self.path,
+            "bytes": len(self._buf),
+            "positions": len(self._position_keys),
+            "book_moves": self._sections["moves"][1],
+        }
+
+    def close(self) -> None:
+        self._buf.close()
+
+
+def load_index(path: Optional[str], source_path: str = None):
+    """
+    Open the index file at `path`, compiling it first if it is missing or older
+    than `source_path`. Falls back to an in-memory index if the file cannot be written.
+    """
+    if path:
+        try:
+            stale = not os.path.exists(path) or (
+                source_path is not None and os.path.getmtime(path) < os.path.getmtime(source_path))
+            if stale:
+                from openings_data import OPENINGS_DATABASE
+                compile_index(OPENINGS_DATABASE, path)
+            return MappedOpeningIndex(path)
+        except (OSError, ValueError):
+            pass
+    from openings_data import OPENINGS_DATABASE
+    return OpeningIndex.build(OPENINGS_DATABASE)
+
+
+# -------------------------
+# Build / benchmark
+# -------------------------
+
+_BENCH_CHILD = """
+import os, sys, time
+import chess, chess.engine, chess.polyglot, json, eval_store  # already loaded by the app
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+rss = rss_kb()
+start = time.perf_counter()
+if sys.argv[1] == "source":
+    from openings_data import OPENINGS_DATABASE
+    from opening_index import OpeningIndex
+    index = OpeningIndex.build(OPENINGS_DATABASE)
+else:
+    from opening_index import MappedOpeningIndex
+    index = MappedOpeningIndex(sys.argv[2])
+index.book_moves(chess.Board())
+print(time.perf_counter() - start, rss_kb() - rss)
+"""
+
+
+def _bench(path: str, runs: int = 5) -> None:
+    """
+    Time and resident-memory growth of loading the index each way, in fresh
+    interpreters (Linux only, as RSS is read from /proc).
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for mode, args in (("openings_data + build", ["source"]), ("mmap index", ["mapped", path])):
+        samples = [subprocess.run([sys.executable, "-c", _BENCH_CHILD, *args], cwd=here,
+                                  capture_output=True, text=True, check=True).stdout.split()
+                   for _ in range(runs)]
+        seconds = min(float(s[0]) for s in samples)
+        rss_kb = min(int(s[1]) for s in samples)
+        print(f"{mode:24s} load {seconds * 1000:7.1f} ms   RSS +{rss_kb / 1024:5.2f} MB")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    out = sys.argv[2] if len(sys.argv) > 2 else "openings.idx"
+    if command == "build":
+        from openings_data import OPENINGS_DATABASE
+        built = compile_index(OPENINGS_DATABASE, out)
+        print(f"wrote {out}: {os.path.getsize(out)} bytes, {built.stats()}")
+    elif command == "bench":
+        if not os.path.exists(out):
+            from openings_data import OPENINGS_DATABASE
+            compile_index(OPENINGS_DATABASE, out)
+        _bench(out)
+    else:
+        sys.exit("usage: python opening_index.py [build|bench] [index path]")
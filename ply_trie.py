@@ -0,0 +1,130 @@
+"""
+Ply Trie
+Graded plies of analyzed games, stored along their move sequences, so a game
+sharing an opening (or everything but the ending) with an earlier one only
+has its new tail searched.
+
+Notes:
+- One trie per root key (analysis settings + start position). Each node is
+  reached by a UCI move and holds the graded ply for that move.
+- A ply's grading depends only on the positions before and after it, so any
+  stored prefix is exactly what a fresh analysis would produce.
+- Every lookup and insert stamps the nodes along its path, so a node is never
+  older than its descendants. Once more than `max_plies` plies are stored,
+  the least recently used leaves are dropped (down to 90% of the cap, so the
+  scan is not repeated on every insert); a branch shrinks from its tail and
+  shared openings, being stamped by every game through them, go last.
+"""
+
+import heapq
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+# Eviction trims the trie to this fraction of `max_plies`
+EVICT_TO = 0.9
+
+
+class _Node:
+    __slots__ = ("ply", "children", "parent", "move", "used")
+
+    def __init__(self, ply: Dict[str, Any] = None, parent: Optional["_Node"] = None, move: str = None):
+        self.ply = ply
+        self.children: Dict[str, "_Node"] = {}
+        self.parent = parent
+        self.move = move
+        self.used = 0
+
+
+class PlyTrie:
+    """
+    Thread-safe move-prefix trie of graded plies with a size cap.
+    """
+
+    def __init__(self, max_plies: int = 20000):
+        self.max_plies = max_plies
+        self._roots: Dict[str, _Node] = {}
+        self._plies = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def match(self, root_key: str, moves_uci: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        The stored plies along the longest stored prefix of `moves_uci`.
+        """
+        with self._lock:
+            self.lookups += 1
+            node = self._roots.get(root_key)
+            if node is None:
+                return []
+            self._clock += 1
+            node.used = self._clock
+            plies = []
+            for uci in moves_uci:
+                node = node.children.get(uci)
+                if node is None:
+                    break
+                node.used = self._clock
+                plies.append(node.ply)
+            self.reused += len(plies)
+            return plies
+
+    def insert(self, root_key: str, moves_uci: Sequence[str], plies: Sequence[Dict[str, Any]]) -> None:
+        """
+        Store `plies[i]` as the grading of `moves_uci[i]` after `moves_uci[:i]`.
+        """
+        with self._lock:
+            node = self._roots.get(root_key)
+            if node is None:
+                node = self._roots[root_key] = _Node()
+            self._clock += 1
+            node.used = self._clock
+            for uci, ply in zip(moves_uci, plies):
+                child = node.children.get(uci)
+                if child is None:
+                    child = node.children[uci] = _Node(ply, node, uci)
+                    self._plies += 1
+                child.used = self._clock
+                node = child
+
+            if self._plies > self.max_plies:
+                self._evict(int(self.max_plies * EVICT_TO))
+
+    def _evict(self, target: int) -> None:
+        """
+        Drop least recently used leaves until at most `target` plies remain.
+        """
+        heap = []
+        stack = list(self._roots.values())
+        while stack:
+            node = stack.pop()
+            if node.children:
+                stack.extend(node.children.values())
+            elif node.parent is not None:
+                heap.append((node.used, id(node), node))
+        heapq.heapify(heap)
+
+        while self._plies > target and heap:
+            _, _, node = heapq.heappop(heap)
+            parent = node.parent
+            del parent.children[node.move]
+            self._plies -= 1
+            self.evicted += 1
+            if not parent.children and parent.parent is not None:
+                heapq.heappush(heap, (parent.used, id(parent), parent))
+
+        for key in [key for key, root in self._roots.items() if not root.children]:
+            del self._roots[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "roots": len(self._roots),
+                "plies": self._plies,
+                "lookups": self.lookups,
+                "reused_plies": self.reused,
+                "evicted_plies": self.evicted,
+            }
@@ -0,0 +1,241 @@
+"""
+Ponder
+Background analysis of the player-to-move position while the player thinks,
+so the next move grading or hint can use a deep result immediately.
+
+Notes:
+- One ponder per game (keyed by session id). Starting a new one for the same
+  key cancels the old one.
+- A ponder borrows an engine from the pool, but only if more than `reserve`
+  engines are free at that moment (checked and taken atomically by
+  `EnginePool.try_acquire`), so ordinary requests always keep `reserve`.
+  It gives the engine back when its result is taken, when it is cancelled,
+  or after `idle_timeout` seconds.
+- Ponder engines are checked out in the pool's "background" class; when a
+  live move or hint finds no engine free, the pool preempts the oldest ponder.
+- The search itself is capped at `max_time` seconds.
+- Optionally a ponder first speculates: it finds the `speculate_moves` most
+  likely player moves with a MultiPV search and pre-evaluates the position
+  after each of them, within `speculate_budget` seconds. Every search result
+  is handed to `on_result(board, limit, info)` (e.g. the evaluation cache), so
+  a matching player move can be graded without a fresh search.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import chess
+import chess.engine
+
+from engine_pool import EnginePool
+
+
+class _Ponder:
+    def __init__(self, fen: str):
+        self.fen = fen
+        self.started_at = time.monotonic()
+        self.pooled = None
+        self.analysis = None
+        self.cancelled = False
+        self.speculated = set()
+        self.timer: Optional[threading.Timer] = None
+
+
+class Ponderer:
+    """
+    Manages at most one background search per key on engines borrowed from `pool`.
+    """
+
+    def __init__(self, pool: EnginePool, multipv: int = 1, max_time: float = 30.0,
+                 reserve: int = 1, idle_timeout: float = 60.0,
+                 speculate_moves: int = 0, speculate_limit: chess.engine.Limit = None,
+                 speculate_budget: float = 0.0,
+                 on_result: Callable[[chess.Board, chess.engine.Limit, Dict[str, Any]], None] = None):
+        self.pool = pool
+        self.multipv = multipv
+        self.max_time = max_time
+        self.reserve = reserve
+        self.idle_timeout = idle_timeout
+        self.speculate_moves = speculate_moves
+        self.speculate_limit = speculate_limit or chess.engine.Limit(time=0.1)
+        self.speculate_budget = speculate_budget
+        self.on_result = on_result
+
+        self._lock = threading.Lock()
+        self._ponders: Dict[str, _Ponder] = {}
+        pool.set_preemptor(self.preempt)
+
+        self.started = 0
+        self.skipped = 0
+        self.preempted = 0
+        self.hits = 0
+        self.misses = 0
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+
+    def start(self, key: str, board: chess.Board) -> None:
+        """
+        Begin pondering `board` for `key` in the background, replacing any previous ponder.
+        """
+        self.cancel(key)
+        if board.is_game_over():
+            return
+        try:
+            pooled = self.pool.try_acquire(reserve=self.reserve, priority="background")
+        except Exception:
+            pooled = None
+        if pooled is None:
+            with self._lock:
+                self.skipped += 1
+            return
+
+        ponder = _Ponder(board.fen())
+        with self._lock:
+            self._ponders[key] = ponder
+            self.started += 1
+        ponder.timer = threading.Timer(self.idle_timeout, self._expire, (key, ponder))
+        ponder.timer.daemon = True
+        ponder.timer.start()
+        threading.Thread(target=self._begin, args=(ponder, pooled, board.copy()), daemon=True).start()
+
+    def take(self, key: str, board: chess.Board, min_depth: int = 1,
+             move: chess.Move = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Stop the ponder for `key` and return its MultiPV lines if it was
+        searching `board` and got at least `min_depth` deep, else None.
+        If the player's `move` is given, it is counted against the speculated moves.
+        """
+        with self._lock:
+            ponder = self._ponders.pop(key, None)
+            if ponder is not None and move is not None and ponder.fen == board.fen() and ponder.speculated:
+                if move in ponder.speculated:
+                    self.speculation_hits += 1
+                else:
+                    self.speculation_misses += 1
+        if ponder is None:
+            return None
+
+        lines = None
+        if ponder.fen == board.fen() and ponder.analysis is not None:
+            ponder.analysis.stop()
+            ponder.analysis.wait()
+            found = [dict(line) for line in ponder.analysis.multipv if "score" in line]
+            if found and found[0].get("depth", 0) >= min_depth:
+                lines = found
+        self._finish(ponder)
+
+        with self._lock:
+            if lines is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return lines
+
+    def cancel(self, key: str) -> None:
+        with self._lock:
+            ponder = self._ponders.pop(key, None)
+        if ponder is not None:
+            self._finish(ponder)
+
+    def preempt(self) -> bool:
+        """
+        Cancel the oldest ponder so its engine goes back to the pool.
+        Returns False if there is none.
+        """
+        with self._lock:
+            if not self._ponders:
+                return False
+            key = min(self._ponders, key=lambda k: self._ponders[k].started_at)
+            ponder = self._ponders.pop(key)
+            self.preempted += 1
+        self._finish(ponder)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            speculated = self.speculation_hits + self.speculation_misses
+            return {
+                "active": len(self._ponders),
+                "started": self.started,
+                "skipped": self.skipped,
+                "preempted": self.preempted,
+                "hits": self.hits,
+                "misses": self.misses,
+                "speculation_hits": self.speculation_hits,
+                "speculation_misses": self.speculation_misses,
+                "speculation_hit_rate": round(self.speculation_hits / speculated, 3) if speculated else 0.0,
+            }
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    def _begin(self, ponder: _Ponder, pooled, board: chess.Board) -> None:
+        try:
+            if self.speculate_moves:
+                self._speculate(ponder, pooled, board)
+            analysis = pooled.analysis(board, chess.engine.Limit(time=self.max_time), multipv=self.multipv)
+        except Exception:
+            self.pool.release(pooled, healthy=False)
+            return
+
+        with self._lock:
+            ponder.pooled = pooled
+            ponder.analysis = analysis
+            cancelled = ponder.cancelled
+        # Cancelled while speculating or starting the search
+        if cancelled:
+            self._release(ponder)
+
+    def _speculate(self, ponder: _Ponder, pooled, board: chess.Board) -> None:
+        """
+        Pre-evaluate the positions after the player's most likely moves.
+        """
+        deadline = time.monotonic() + self.speculate_budget
+        limit = self.speculate_limit
+        lines = pooled.analyse(board, limit, multipv=self.speculate_moves)
+        if lines and self.on_result:
+            self.on_result(board, limit, lines[0])
+
+        for line in lines:
+            if ponder.cancelled or time.monotonic() >= deadline:
+                break
+            if not line.get("pv"):
+                continue
+            move = line["pv"][0]
+            after = board.copy(stack=False)
+            after.push(move)
+            info = pooled.analyse(after, limit)
+            if self.on_result:
+                self.on_result(after, limit, info)
+            ponder.speculated.add(move)
+
+    def _expire(self, key: str, ponder: _Ponder) -> None:
+        with self._lock:
+            if self._ponders.get(key) is not ponder:
+                return
+            del self._ponders[key]
+        self._finish(ponder)
+
+    def _finish(self, ponder: _Ponder) -> None:
+        if ponder.timer is not None:
+            ponder.timer.cancel()
+        with self._lock:
+            ponder.cancelled = True
+            started = ponder.pooled is not None
+        if started:
+            self._release(ponder)
+
+    def _release(self, ponder: _Ponder) -> None:
+        with self._lock:
+            pooled, ponder.pooled = ponder.pooled, None
+        if pooled is None:
+            return
+        healthy = True
+        try:
+            ponder.analysis.stop()
+            ponder.analysis.wait()
+        except Exception:
+            healthy = False
+        self.pool.release(pooled, healthy=healthy)
@@ -0,0 +1,86 @@
+"""
+Result Cache
+Whole-game analysis results stored on disk under a content hash, so a game
+that has been analyzed before (with the same settings) is served without
+touching the engine.
+
+Notes:
+- The caller picks the key; app.py hashes the normalized mainline (start FEN
+  and UCI moves) together with every setting that affects the result.
+- Each result is a zlib-compressed JSON file, written atomically so several
+  workers can share the directory.
+- Once more than `max_files` results are stored, the least recently written
+  ones are removed.
+"""
+
+import json
+import os
+import threading
+import zlib
+from typing import Any, Dict, Optional
+
+
+class ResultCache:
+    """
+    Thread-safe, directory-backed store of JSON-serializable results.
+    """
+
+    def __init__(self, directory: str, max_files: int = 1000):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.z")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                result = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, zlib.error):
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        data = zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"), 6)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.writes += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json.z")]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+            }
@@ -0,0 +1,124 @@
+"""
+Tablebase
+Syzygy endgame tablebase probing in Python, so positions with few enough
+pieces are settled exactly without an engine search.
+
+Notes:
+- `path` is one or more local directories of .rtbw/.rtbz files, separated by
+  os.pathsep, the same value Stockfish takes as its SyzygyPath option.
+- WDL alone decides the score: a win is a flat TABLEBASE_WIN_CP, a loss the
+  negation, and draws, cursed wins and blessed losses are 0. DTZ counts moves
+  to the next capture or pawn move, not to mate, and restarts after each one,
+  so it says nothing about how close the win is and is not scored.
+- With DTZ tables present, every legal move is probed to find the best one
+  (keeping the WDL result, zeroing soonest when winning), which becomes a
+  one-move PV.
+- Results carry depth TABLEBASE_DEPTH, so they outrank any engine search in
+  the evaluation caches and can be recognised after a round trip through them.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import chess
+import chess.engine
+import chess.syzygy
+
+TABLEBASE_WIN_CP = 20000
+TABLEBASE_DEPTH = 255
+
+
+class TablebaseProber:
+    """
+    Thread-safe WDL/DTZ prober with hit counters.
+    """
+
+    def __init__(self, path: str, max_pieces: Optional[int] = None):
+        self.path = path
+        self.tablebase = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            if directory:
+                self.tablebase.add_directory(directory)
+
+        # Table names look like "KRPvKR"; the piece count is the number of letters
+        largest = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+        self.max_pieces = min(max_pieces, largest) if max_pieces else largest
+
+        self._lock = threading.Lock()
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, board: chess.Board) -> Optional[Dict[str, Any]]:
+        """
+        An exact `analyse`-style result for `board`, or None if it is not in the tablebase.
+        """
+        if chess.popcount(board.occupied) > self.max_pieces or board.castling_rights:
+            return None
+        with self._lock:
+            self.probes += 1
+        try:
+            wdl = self.tablebase.probe_wdl(board)
+        except KeyError:
+            with self._lock:
+                self.misses += 1
+            return None
+        dtz = self.tablebase.get_dtz(board)
+
+        with self._lock:
+            self.hits += 1
+        best = self._best_move(board) if dtz is not None else None
+        return {
+            "score": chess.engine.PovScore(_wdl_score(wdl), board.turn),
+            "pv": [best] if best is not None else [],
+            "depth": TABLEBASE_DEPTH,
+        }
+
+    def _best_move(self, board: chess.Board) -> Optional[chess.Move]:
+        """
+        The move that keeps the best WDL result, converting fastest when winning
+        and holding out longest when losing.
+        """
+        best, best_rank = None, None
+        for move in board.legal_moves:
+            child = board.copy(stack=False)
+            child.push(move)
+            if child.is_checkmate():
+                return move
+            child_wdl = self.tablebase.get_wdl(child)
+            child_dtz = self.tablebase.get_dtz(child)
+            if child_wdl is None or child_dtz is None:
+                return None
+            wdl = -child_wdl
+            if wdl > 0:
+                rank = (wdl, -abs(child_dtz))
+            elif wdl < 0:
+                rank = (wdl, abs(child_dtz))
+            else:
+                rank = (0, 0)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "max_pieces": self.max_pieces,
+                "probes": self.probes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self) -> None:
+        self.tablebase.close()
+
+
+def _wdl_score(wdl: int) -> chess.engine.Score:
+    if wdl == 2:
+        return chess.engine.Cp(TABLEBASE_WIN_CP)
+    if wdl == -2:
+        return chess.engine.Cp(-TABLEBASE_WIN_CP)
+    # Draws, and results the fifty-move rule turns into draws
+    return chess.engine.Cp(0)